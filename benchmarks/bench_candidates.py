@@ -0,0 +1,83 @@
+"""Candidate row memory benchmark: legacy per-row dicts vs candidates.Candidate records,
+with paths as strings or as ids into a prefix-compressed paths.PathTable.
+
+Usage: python benchmarks/bench_candidates.py [rows]
+Rows are verified (both digests set) and share Folder-A path buckets like real Stage 1 output.
+Path strings are built inside each measurement from (dir, name) pairs, as the walker produces them.
+"""
+import hashlib
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from candidates import Candidate, CandidateStore
+from paths import PathTable
+
+
+def inputs(n: int):
+    buckets = [
+        tuple((f"/mnt/archive/photos/{y}/{i % 500}", f"IMG_{i}.JPG") for y in (2019, 2020)[: 1 + i % 2])
+        for i in range(n // 4)
+    ]
+    paths_b = [(f"/mnt/incoming/batch_{i % 1000}", f"IMG_{i // 4}.JPG") for i in range(n)]
+    digests = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(64)]
+    return buckets, paths_b, digests
+
+
+def legacy_rows(n, buckets, paths_b, digests):
+    rows = []
+    joined = [tuple(os.path.join(*p) for p in bucket) for bucket in buckets]
+    for i in range(n):
+        rows.append({
+            "name": f"IMG_{i // 4}.JPG",
+            "size": 1000 + i,
+            "a_paths": list(joined[i // 4]),
+            "path_b": os.path.join(*paths_b[i]),
+            "status": "MATCH",
+            "hash_algo": "blake3",
+            "hash_a": "".join(digests[i % 64]),
+            "hash_b": "".join(digests[(i + 1) % 64]),
+        })
+    return rows
+
+
+def store_rows(n, buckets, paths_b, digests, table=None):
+    store = CandidateStore()
+    if table is not None:
+        shared = [tuple(table.add(d, name) for d, name in bucket) for bucket in buckets]
+    else:
+        shared = [tuple(os.path.join(d, name) for d, name in bucket) for bucket in buckets]
+    for i in range(n):
+        d, name = paths_b[i]
+        b = table.add(d, name) if table is not None else os.path.join(d, name)
+        c = Candidate(name, 1000 + i, shared[i // 4], b, table)
+        c.status = "MATCH"
+        c.hash_algo = "blake3"
+        c.hash_a = digests[i % 64]
+        c.hash_b = digests[(i + 1) % 64]
+        store.append(c)
+    return store
+
+
+def measure(label, fn, n, data):
+    tracemalloc.start()
+    rows = fn(n, *data)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {n:>9} rows  {current / 1e6:9.1f} MB  {current / n:7.0f} B/row")
+    del rows
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    data = inputs(n)
+    measure("dict rows", legacy_rows, n, data)
+    measure("Candidate", store_rows, n, data)
+    measure("+PathTable", lambda *a: store_rows(*a, table=PathTable()), n, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Folder A index benchmark: full listing vs rescan through a persistent FolderIndex.
+
+Usage: python benchmarks/bench_folder_index.py [folder] [--latency-ms N]
+Without a folder, a synthetic tree is generated (and aged) in a temporary directory.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bench_stage1 import add_latency, make_tree
+from folder_index import FolderIndex
+from walker import TreeWalker
+
+
+def walk(folder, index=None, workers=8):
+    return sum(1 for _ in TreeWalker([folder], workers=workers, indexes=[index]))
+
+
+def run_all(folder, index_file):
+    t0 = time.perf_counter()
+    n = walk(folder)
+    print(f"plain walk           {n:>9} files  {time.perf_counter() - t0:8.3f} s")
+
+    index = FolderIndex(folder, index_file)
+    t0 = time.perf_counter()
+    walk(folder, index)
+    index.save()
+    print(f"cold index + save    {n:>9} files  {time.perf_counter() - t0:8.3f} s"
+          f"  ({os.path.getsize(index_file) / 1e6:.1f} MB on disk)")
+
+    index = FolderIndex(folder, index_file)
+    t0 = time.perf_counter()
+    index.load()
+    t_load = time.perf_counter() - t0
+    walk(folder, index)
+    print(f"warm rescan          {n:>9} files  {time.perf_counter() - t0:8.3f} s"
+          f"  (load {t_load:.3f} s, reused {index.reused}, listed {index.listed} dirs)")
+
+
+def main():
+    args = sys.argv[1:]
+    if "--latency-ms" in args:
+        i = args.index("--latency-ms")
+        add_latency(float(args[i + 1]))
+        del args[i:i + 2]
+    with tempfile.TemporaryDirectory() as tmp:
+        index_file = Path(tmp) / "index.pickle"
+        if args:
+            run_all(args[0], index_file)
+            return
+        tree = Path(tmp) / "tree"
+        make_tree(tree)
+        past = time.time() - 3600
+        for d, _, _ in os.walk(tree):
+            os.utime(d, (past, past))
+        run_all(str(tree), index_file)
+
+
+if __name__ == "__main__":
+    main()
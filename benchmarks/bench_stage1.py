@@ -0,0 +1,99 @@
+"""Stage 1 traversal benchmark: legacy rglob+getsize walk vs the scandir walkers.
+
+Usage: python benchmarks/bench_stage1.py [folder] [--latency-ms N]
+Without a folder, a synthetic tree is generated in a temporary directory.
+--latency-ms adds a sleep to every directory listing to mimic an SMB/NFS share.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utils import to_long_path
+import walker
+from walker import TreeWalker, iter_entries
+
+
+def make_tree(root: Path, dirs: int = 200, files_per_dir: int = 100):
+    for d in range(dirs):
+        sub = root / f"d{d // 20}" / f"s{d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for f in range(files_per_dir):
+            (sub / f"file_{f}.dat").write_bytes(b"x" * (f % 7))
+
+
+def legacy_walk(folder):
+    n = 0
+    for path in Path(folder).rglob("*"):
+        if path.is_file():
+            p = str(path)
+            os.path.getsize(to_long_path(p))
+            os.path.normcase(os.path.basename(p))
+            n += 1
+    return n
+
+
+def scandir_walk(folder):
+    n = 0
+    for e in iter_entries(folder):
+        os.path.normcase(e.name)
+        n += 1
+    return n
+
+
+def parallel_walk(workers):
+    def run(folder):
+        n = 0
+        for e in TreeWalker([folder], workers=workers):
+            os.path.normcase(e.name)
+            n += 1
+        return n
+    return run
+
+
+def add_latency(ms: float):
+    orig_scandir = os.scandir
+
+    def slow_scandir(path):
+        time.sleep(ms / 1000.0)
+        return orig_scandir(path)
+
+    walker.os.scandir = slow_scandir  # walker and pathlib share the os module
+
+
+def bench(label, fn, folder, repeat=3):
+    best = float("inf")
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = fn(folder)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<16} {n:>9} files  {best:8.3f} s  {n / best:>12,.0f} files/s")
+
+
+def run_all(folder):
+    bench("rglob+getsize", legacy_walk, folder)
+    bench("scandir", scandir_walk, folder)
+    for workers in (1, 4, 8, 16):
+        bench(f"tree x{workers}", parallel_walk(workers), folder)
+
+
+def main():
+    args = sys.argv[1:]
+    if "--latency-ms" in args:
+        i = args.index("--latency-ms")
+        add_latency(float(args[i + 1]))
+        del args[i:i + 2]
+    if args:
+        run_all(args[0])
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(Path(tmp))
+        run_all(tmp)
+
+
+if __name__ == "__main__":
+    main()
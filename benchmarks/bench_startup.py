@@ -0,0 +1,74 @@
+"""Startup benchmark: time until the main window is shown, with a large hash cache on disk.
+
+Usage: python benchmarks/bench_startup.py [--entries N]
+Writes a legacy hash_cache.json with N entries (default 1,000,000) into a temporary cache
+directory, then launches the app twice, each time in a fresh interpreter and off-screen:
+  1. with the legacy JSON only (the first start after upgrading migrates it to SQLite),
+  2. with the migrated SQLite cache,
+and reports the time to import gui, to show the window and to answer the first cache
+lookup. For comparison it also times json.load() of the file, which is what every start
+used to cost before the window appeared. The cache directory is redirected through
+XDG_CACHE_HOME, so this runs on Linux only.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+CHILD = r"""
+import sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import gui
+from hashing import HASH_CACHE
+t_import = time.perf_counter() - t0
+app = gui.QApplication([])
+win = gui.App()
+win.show()
+app.processEvents()
+HASH_CACHE.open_in_background()
+t_shown = time.perf_counter() - t0
+hit = HASH_CACHE.get("/data/d7/f7.bin", 7, 7, "blake3")
+t_lookup = time.perf_counter() - t0
+print(f"{t_import:.3f} {t_shown:.3f} {t_lookup:.3f} {hit is not None}")
+"""
+
+
+def write_legacy(path: Path, entries: int):
+    cache = {f"/data/d{i % 1000}/f{i}.bin|{i}|{i}|blake3|v1": f"{i:064x}" for i in range(entries)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+
+def launch(label: str, env: dict):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(ROOT)], env=env, capture_output=True, text=True, check=True
+    ).stdout.split()
+    t_import, t_shown, t_lookup, hit = out[-4:]
+    print(f"{label:<22} import {t_import}s  window shown {t_shown}s  first lookup {t_lookup}s  (hit={hit})")
+
+
+def main():
+    args = sys.argv[1:]
+    entries = int(args[args.index("--entries") + 1]) if "--entries" in args else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=tmp, QT_QPA_PLATFORM="offscreen")
+        legacy = Path(tmp) / "DedupeUI" / "hash_cache.json"
+        write_legacy(legacy, entries)
+        print(f"{entries} entries, legacy JSON {legacy.stat().st_size / 1e6:.0f} MB")
+        t0 = time.perf_counter()
+        with legacy.open("r", encoding="utf-8") as f:
+            json.load(f)
+        print(f"{'json.load (old start)':<22} {time.perf_counter() - t0:.3f}s")
+        launch("first start (migrate)", env)
+        launch("SQLite cache", env)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Stage 2 backend benchmark: Verifier hashing in threads vs in a process pool.
+
+Usage: python benchmarks/bench_verifier_backends.py [--files N] [--size-mb N] [--algo sha256|blake3]
+Writes N random pairs (default 32 x 16 MB) to a temporary directory, then verifies them with
+each backend at 1, 2, 4 and 8 workers. The hash cache is cleared before every run and never
+saved, so each run hashes everything (from the warm page cache, i.e. the CPU-bound case).
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import hashing
+from stage1 import Stage1Scanner
+from verifier import Verifier
+
+
+def make_pairs(root: Path, files: int, size_mb: int):
+    for i in range(files):
+        data = os.urandom(size_mb * 1024 * 1024)
+        for side in ("A", "B"):
+            d = root / side
+            d.mkdir(exist_ok=True)
+            (d / f"file_{i}.bin").write_bytes(data)
+
+
+def run(root: Path, backend: str, workers: int, algo: str, total_bytes: int):
+    rows = Stage1Scanner(str(root / "A"), str(root / "B")).run()
+    hashing.HASH_CACHE.clear()
+    t0 = time.perf_counter()
+    done, matches = Verifier(algo, workers, backend=backend, partial=False).verify_rows(rows)
+    dt = time.perf_counter() - t0
+    print(f"{backend:<8} workers={workers:<2} {dt:7.2f}s  {total_bytes / dt / 1e6:8.0f} MB/s  ({matches}/{done} match)")
+
+
+def main():
+    args = sys.argv[1:]
+    opts = {"--files": "32", "--size-mb": "16", "--algo": "sha256"}
+    for flag in opts:
+        if flag in args:
+            i = args.index(flag)
+            opts[flag] = args[i + 1]
+            del args[i:i + 2]
+    files, size_mb, algo = int(opts["--files"]), int(opts["--size-mb"]), opts["--algo"]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_pairs(root, files, size_mb)
+        total = 2 * files * size_mb * 1024 * 1024
+        for workers in (1, 2, 4, 8):
+            for backend in ("thread", "process"):
+                run(root, backend, workers, algo, total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+from paths import PathTable
+
+STATUSES = ("PENDING", "MATCH", "DIFF", "ERROR", "DELETED")
+PENDING, MATCH, DIFF, ERROR, DELETED = range(len(STATUSES))
+_STATUS_CODE = {s: i for i, s in enumerate(STATUSES)}
+# hash_algo of rows matched because B is a hardlink of an A path (nothing was hashed)
+HARDLINK = "hardlink"
+# hash_algo of rows decided by a byte-for-byte compare that computed no digest
+COMPARED = "compare"
+
+_KEYS = frozenset(("name", "size", "a_paths", "path_b", "status", "hash_algo", "hash_a", "hash_b"))
+
+
+def _to_bytes(digest):
+    if digest is None or isinstance(digest, bytes):
+        return digest
+    return bytes.fromhex(digest)
+
+
+# ================== Candidate Store ==================
+class Candidate:
+    """
+    One Stage 1 row, stored compactly: status as a small int, digests as raw bytes and the
+    Folder-A paths as a tuple shared with every other row of the same name+size (the matched
+    path is selected by index instead of reordering a private copy). With a PathTable, paths
+    are int ids into it rather than strings.
+
+    Rows also answer the dict-style interface the GUI and older callers use
+    (row["status"], row.get("hash_b"), row["a_paths"] = [...]).
+    """
+    __slots__ = (
+        "name", "size", "hash_algo", "_table", "_a_paths", "_a_first", "_b", "_status", "_hash_a", "_hash_b",
+    )
+
+    def __init__(self, name: str, size: int, a_paths: tuple, path_b, table: PathTable | None = None):
+        self.name = name
+        self.size = size
+        self.hash_algo = None
+        self._table = table
+        self._a_paths = a_paths if isinstance(a_paths, tuple) else tuple(a_paths)
+        self._a_first = 0
+        self._b = path_b
+        self._status = PENDING
+        self._hash_a = None
+        self._hash_b = None
+
+    def _resolve(self, p) -> str:
+        return self._table.path(p) if self._table is not None else p
+
+    # ---- typed accessors ----
+    @property
+    def status(self) -> str:
+        return STATUSES[self._status]
+
+    @status.setter
+    def status(self, value: str):
+        self._status = _STATUS_CODE[value]
+
+    @property
+    def status_code(self) -> int:
+        return self._status
+
+    @property
+    def path_b(self) -> str:
+        return self._resolve(self._b)
+
+    @path_b.setter
+    def path_b(self, value: str):
+        self._b = self._table.add_path(value) if self._table is not None else value
+
+    @property
+    def a_paths(self) -> list[str]:
+        """Folder-A paths, matched one first (a fresh list; assign to reorder)."""
+        paths = [self._resolve(p) for p in self._a_paths]
+        i = self._a_first
+        if i:
+            paths.insert(0, paths.pop(i))
+        return paths
+
+    @a_paths.setter
+    def a_paths(self, value):
+        value = list(value)
+        current = [self._resolve(p) for p in self._a_paths]
+        if value and set(value) == set(current):
+            # Same set, new order: keep sharing the tuple and only remember the first one
+            self._a_first = current.index(value[0])
+        else:
+            t = self._table
+            self._a_paths = tuple(t.add_path(p) for p in value) if t is not None else tuple(value)
+            self._a_first = 0
+
+    @property
+    def a_first(self) -> str:
+        return self._resolve(self._a_paths[self._a_first]) if self._a_paths else ""
+
+    def promote_a(self, index: int):
+        """Mark a_paths[index] (in the current order) as the matched path."""
+        if index:
+            order = list(range(len(self._a_paths)))
+            order.insert(0, order.pop(self._a_first))
+            self._a_first = order[index]
+
+    @property
+    def hash_a(self) -> str | None:
+        return self._hash_a.hex() if self._hash_a is not None else None
+
+    @hash_a.setter
+    def hash_a(self, value):
+        self._hash_a = _to_bytes(value)
+
+    @property
+    def hash_b(self) -> str | None:
+        return self._hash_b.hex() if self._hash_b is not None else None
+
+    @hash_b.setter
+    def hash_b(self, value):
+        self._hash_b = _to_bytes(value)
+
+    # ---- dict-style compatibility ----
+    def __getitem__(self, key: str):
+        if key not in _KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in _KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in _KEYS else default
+
+    def _fields(self):
+        return (self.name, self.size, self.a_paths, self.path_b, self._status, self.hash_algo, self._hash_a, self._hash_b)
+
+    def __eq__(self, other):
+        if not isinstance(other, Candidate):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Candidate({self.name!r}, {self.size}, {self.status}, path_b={self.path_b!r})"
+
+
+class CandidateStore(list):
+    """List of Candidate rows with helpers that avoid materialising per-row dicts."""
+
+    def add(self, name: str, size: int, a_paths: tuple, path_b, table: PathTable | None = None) -> Candidate:
+        c = Candidate(name, size, a_paths, path_b, table)
+        self.append(c)
+        return c
+
+    def pending(self) -> list[Candidate]:
+        return [c for c in self if c.status_code == PENDING]
+
+    def count_status(self, status: str) -> int:
+        code = _STATUS_CODE[status]
+        return sum(1 for c in self if c.status_code == code)
@@ -14,9 +14,13 @@ Fixes included:
 """
 
 from gui import main
+import multiprocessing
 import os
 
 if __name__ == "__main__":
+    # In the frozen exe a spawned hashing process (Verifier backend="process") re-runs this
+    # file; freeze_support() turns it into the pool child instead of a second window.
+    multiprocessing.freeze_support()
     if os.name == "nt":
         try:
             import ctypes  # DPI awareness for sharper UI on Windows
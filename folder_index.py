@@ -0,0 +1,196 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+
+from utils import cache_dir, to_long_path
+from walker import FileEntry, TreeWalker, list_dir
+
+# A directory whose mtime is this close to the moment it was listed may have changed again
+# within the same timestamp tick, so its listing is not trusted on the next scan.
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def _index_path(root: str) -> Path:
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(root)).encode("utf-8", "surrogatepass")).hexdigest()
+    d = cache_dir() / "folder_index"
+    d.mkdir(parents=True, exist_ok=True)
+    return d / f"{key}.pickle"
+
+# ================== Folder Index ==================
+class FolderIndex:
+    """
+    Persistent listing of one folder tree, keyed by directory:
+    dir_path -> (dir_mtime_ns, listed_at_ns, [subdir names], [(name, size, mtime_ns, ino, dev), ...]).
+
+    Used as the lister for a TreeWalker root: a directory whose mtime is unchanged since it was
+    stored is answered from the index with one stat instead of a listing plus a stat per file.
+    Adding, removing or renaming an entry bumps the directory mtime; rewriting a file in place
+    does not, so sizes of modified files may be stale until their directory changes. Stage 2
+    re-stats and hashes every file it verifies, so this can only cost a candidate, never a
+    false MATCH.
+
+    Whenever a stored directory is re-listed, files that disappeared or changed size/mtime are
+    collected in `stale` (see take_stale) so cached digests can be invalidated. While a
+    FolderWatcher keeps the index up to date it sets `live`, and Stage 1 then reads Folder A
+    from memory without touching the disk.
+    """
+    VERSION = 1
+
+    def __init__(self, root: str, path: str | Path | None = None):
+        self.root = str(root)
+        self.path = Path(path) if path else _index_path(self.root)
+        self.dirs: dict[str, tuple] = {}
+        self.seen: set[str] = set()
+        self.stale: list[str] = []
+        self.live = False
+        self.reused = 0
+        self.listed = 0
+        self.lock = threading.Lock()
+
+    def load(self) -> bool:
+        try:
+            with self.path.open("rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != self.VERSION or data.get("root") != self.root:
+                return False
+            self.dirs = data["dirs"]
+            return True
+        except Exception:
+            self.dirs = {}
+            return False
+
+    def save(self, prune: bool = True):
+        """Write the index; with prune, directories not visited since load are dropped."""
+        with self.lock:
+            if prune:
+                self.dirs = {d: v for d, v in self.dirs.items() if d in self.seen}
+            data = {"version": self.VERSION, "root": self.root, "dirs": dict(self.dirs)}
+        try:
+            tmp = self.path.with_suffix(".tmp")
+            with tmp.open("wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(self.path)
+        except Exception:
+            pass
+
+    def _drop_tree(self, d: str):
+        """Forget d and everything below it (caller holds the lock)."""
+        old = self.dirs.pop(d, None)
+        self.seen.discard(d)
+        if old is None:
+            return
+        self.stale.extend(os.path.join(d, f[0]) for f in old[3])
+        for s in old[2]:
+            self._drop_tree(os.path.join(d, s))
+
+    def _store(self, d: str, mtime_ns: int, listed_at: int, files: list[FileEntry], subdirs: list[str]):
+        names = [os.path.basename(s) for s in subdirs]
+        rows = [(e.name, e.size, e.mtime_ns, e.ino, e.dev) for e in files]
+        with self.lock:
+            old = self.dirs.get(d)
+            self.dirs[d] = (mtime_ns, listed_at, names, rows)
+            self.seen.add(d)
+            if old is None:
+                return
+            now = {r[0]: r for r in rows}
+            for r in old[3]:
+                cur = now.get(r[0])
+                if cur is None or cur[1:3] != r[1:3]:
+                    self.stale.append(os.path.join(d, r[0]))
+            keep = set(names)
+            for s in old[2]:
+                if s not in keep:
+                    self._drop_tree(os.path.join(d, s))
+
+    def list_dir(self, d: str, on_error=None, force: bool = False) -> tuple[list[FileEntry], list[str]]:
+        """Drop-in for walker.list_dir that reuses the stored listing when d is unchanged."""
+        try:
+            mtime_ns = os.stat(to_long_path(d)).st_mtime_ns
+        except OSError as ex:
+            with self.lock:
+                self._drop_tree(d)
+            if on_error:
+                on_error(d, ex)
+            return [], []
+        cached = self.dirs.get(d)
+        if (
+            not force and cached is not None
+            and cached[0] == mtime_ns and cached[1] - mtime_ns > RACY_WINDOW_NS
+        ):
+            with self.lock:
+                self.reused += 1
+                self.seen.add(d)
+            return (
+                [FileEntry(d, *f) for f in cached[3]],
+                [os.path.join(d, s) for s in cached[2]],
+            )
+
+        failed = []
+
+        def _err(p, ex):
+            failed.append(p)
+            if on_error:
+                on_error(p, ex)
+
+        listed_at = time.time_ns()
+        files, subdirs = list_dir(d, _err)
+        with self.lock:
+            self.listed += 1
+        if failed:
+            # Never store an incomplete listing; retry the directory next time
+            with self.lock:
+                self.dirs.pop(d, None)
+                self.seen.add(d)
+        else:
+            self._store(d, mtime_ns, listed_at, files, subdirs)
+        return files, subdirs
+
+    def relist(self, d: str, on_error=None) -> list[str]:
+        """
+        Re-list d regardless of its mtime and index any subdirectory not known yet.
+        Returns the directories that were newly indexed (for adding watches).
+        """
+        if os.path.normcase(d) != os.path.normcase(self.root) and not os.path.isdir(to_long_path(d)):
+            with self.lock:
+                self._drop_tree(d)
+            return []
+        new_dirs = []
+        stack = [d]
+        force = True
+        while stack:
+            cur = stack.pop()
+            _, subdirs = self.list_dir(cur, on_error, force=force)
+            force = False
+            for s in subdirs:
+                if s not in self.dirs:
+                    new_dirs.append(s)
+                    stack.append(s)
+        return new_dirs
+
+    def refresh(self, workers: int = 1, on_error=None, stop_event: threading.Event | None = None) -> bool:
+        """Walk the whole tree through the index (only changed directories are re-listed)."""
+        with self.lock:
+            self.seen = set()
+        walker = TreeWalker([self.root], workers=workers, on_error=on_error, stop_event=stop_event, indexes=[self])
+        for _ in walker.batches():
+            pass
+        if stop_event is not None and stop_event.is_set():
+            return False
+        with self.lock:
+            for d in [d for d in self.dirs if d not in self.seen]:
+                self._drop_tree(d)
+        return True
+
+    def take_stale(self) -> list[str]:
+        with self.lock:
+            stale, self.stale = self.stale, []
+        return stale
+
+    def entries(self) -> list[FileEntry]:
+        """Snapshot of every indexed file."""
+        with self.lock:
+            items = list(self.dirs.items())
+        return [FileEntry(d, *f) for d, v in items for f in v[3]]
@@ -1,11 +1,13 @@
 import os
 import sys
 import threading
+import time
 
 from PySide6.QtCore import Qt, QObject, QThread, Signal
 from PySide6.QtGui import QColor, QDropEvent, QDragEnterEvent
 from PySide6.QtWidgets import (
     QApplication,
+    QCheckBox,
     QComboBox,
     QFileDialog,
     QGridLayout,
@@ -25,10 +27,14 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
-from utils import human_size, to_long_path, has_blake3, DEFAULT_WORKERS
+from utils import human_size, parse_size, to_long_path, has_blake3, fast_algo, DEFAULT_WORKERS
 import file_ops
+from candidates import Candidate, CandidateStore
+from folder_index import FolderIndex
 from stage1 import Stage1Scanner
+from watcher import FolderWatcher
 from verifier import Verifier
+from walker import WalkFilter
 from hashing import HASH_CACHE
 
 
@@ -60,21 +66,55 @@ class FolderLineEdit(QLineEdit):
 
 # -------------------- Worker Threads --------------------
 class Stage1Worker(QObject):
-    progress = Signal(str, float)
+    progress = Signal(str, object)  # pct may be None
     stats = Signal(dict)
-    finished = Signal(list)
+    batch = Signal(object)  # list[Candidate] of new rows
+    counter = Signal(int, int, int)  # auto-verify progress
+    finished = Signal(int)
     error = Signal(str)
     log = Signal(str)
 
-    def __init__(self, folder_a: str, folder_b: str):
+    BATCH_ROWS = 500
+    BATCH_SECONDS = 0.25
+
+    def __init__(
+        self,
+        folder_a: str,
+        folder_b: str,
+        workers: int = 1,
+        auto_verify_algo: str | None = None,
+        use_a_index: bool = False,
+        a_watcher: FolderWatcher | None = None,
+        filters: WalkFilter | None = None,
+        verify_opts: dict | None = None,
+    ):
         super().__init__()
         self.folder_a = folder_a
         self.folder_b = folder_b
+        self.workers = workers
+        self.auto_verify_algo = auto_verify_algo
+        self.use_a_index = use_a_index
+        self.a_watcher = a_watcher
+        self.filters = filters
+        self.verify_opts = verify_opts or {}
+        self.found = 0
         self.stop_event = threading.Event()
         self.pause_event = threading.Event()
 
     def run(self):
         try:
+            a_index = None
+            if self.a_watcher is not None:
+                self.progress.emit("Stage 1: waiting for the Folder A watcher to sync…", None)
+                while not self.a_watcher.ready.wait(0.1):
+                    if self.stop_event.is_set():
+                        self.finished.emit(0)
+                        return
+                a_index = self.a_watcher.index
+            elif self.use_a_index:
+                self.progress.emit("Stage 1: loading Folder A index…", None)
+                a_index = FolderIndex(self.folder_a)
+                a_index.load()
             scanner = Stage1Scanner(
                 self.folder_a,
                 self.folder_b,
@@ -83,12 +123,47 @@ class Stage1Worker(QObject):
                 ui_log=lambda m: self.log.emit(m),
                 stop_event=self.stop_event,
                 pause_event=self.pause_event,
+                workers=self.workers,
+                a_index=a_index,
+                filters=self.filters,
             )
-            results = scanner.run()
-            self.finished.emit(results)
+            rows = self._emit_batches(scanner.iter_candidates())
+            if self.auto_verify_algo:
+                verifier = Verifier(
+                    self.auto_verify_algo,
+                    self.workers,
+                    ui_progress=lambda t, p: self.progress.emit(t, p),
+                    ui_counter=lambda d, t, m: self.counter.emit(d, t, m),
+                    ui_log=lambda m: self.log.emit(m),
+                    stop_event=self.stop_event,
+                    pause_event=self.pause_event,
+                    **self.verify_opts,
+                )
+                verifier.verify_stream(rows)
+            else:
+                for _ in rows:
+                    pass
+            self.finished.emit(self.found)
         except Exception as e:  # pragma: no cover - safety
             self.error.emit(str(e))
 
+    def _emit_batches(self, rows):
+        """Pass rows through while sending them to the GUI in batches."""
+        buf = []
+        last = time.monotonic()
+        for row in rows:
+            buf.append(row)
+            now = time.monotonic()
+            if len(buf) >= self.BATCH_ROWS or now - last >= self.BATCH_SECONDS:
+                self.found += len(buf)
+                self.batch.emit(buf)
+                buf = []
+                last = now
+            yield row
+        if buf:
+            self.found += len(buf)
+            self.batch.emit(buf)
+
     def stop(self):
         self.stop_event.set()
 
@@ -100,15 +175,18 @@ class Stage1Worker(QObject):
 
 
 class Stage2Worker(QObject):
-    progress = Signal(str, float)
+    progress = Signal(str, object)  # pct may be None
     counter = Signal(int, int, int)
     finished = Signal(int, int)
     error = Signal(str)
     log = Signal(str)
 
-    def __init__(self, algo: str, workers: int, rows: list[dict]):
+    def __init__(
+        self, algo: str, workers: int, rows: list[Candidate], verify_opts: dict | None = None
+    ):
         super().__init__()
         self.algo = algo
+        self.verify_opts = verify_opts or {}
         self.workers = workers
         self.rows = rows
         self.stop_event = threading.Event()
@@ -124,6 +202,7 @@ class Stage2Worker(QObject):
                 ui_log=lambda m: self.log.emit(m),
                 stop_event=self.stop_event,
                 pause_event=self.pause_event,
+                **self.verify_opts,
             )
             done, matches = verifier.verify_rows(self.rows)
             self.finished.emit(done, matches)
@@ -140,8 +219,44 @@ class Stage2Worker(QObject):
         self.pause_event.clear()
 
 
+class CompactWorker(QObject):
+    progress = Signal(str, object)
+    finished = Signal(int)
+    error = Signal(str)
+
+    def __init__(self, workers: int):
+        super().__init__()
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self.pause_event = threading.Event()
+
+    def run(self):
+        try:
+            removed = HASH_CACHE.compact(
+                workers=self.workers,
+                ui_progress=lambda t, p: self.progress.emit(t, p),
+                stop_event=self.stop_event,
+            )
+            self.finished.emit(removed)
+        except Exception as e:  # pragma: no cover - safety
+            self.error.emit(str(e))
+        finally:
+            HASH_CACHE.release_thread()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def pause(self):
+        self.pause_event.set()
+
+    def resume(self):
+        self.pause_event.clear()
+
+
 # -------------------- Main Window --------------------
 class App(QMainWindow):
+    watcher_log = Signal(str)  # FolderWatcher runs on its own thread
+
     def __init__(self) -> None:
         super().__init__()
         self.setWindowTitle("Two-Stage De-dupe (name+size → on-demand hash)")
@@ -149,8 +264,9 @@ class App(QMainWindow):
         self.setMinimumSize(1100, 600)
 
         self.algos = ["blake3", "sha256"] if has_blake3() else ["sha256"]
-        self.candidates: list[dict] = []
+        self.candidates: CandidateStore = CandidateStore()
         self.current_worker = None
+        self.a_watcher: FolderWatcher | None = None
 
         # -------------------- Layout --------------------
         central = QWidget(self)
@@ -193,8 +309,65 @@ class App(QMainWindow):
         btn_browse_q = QPushButton("Browse…")
         btn_browse_q.clicked.connect(self.browse_q)
         top.addWidget(btn_browse_q, 3, 2)
+
+        top.addWidget(QLabel("Exclude:"), 4, 0)
+        self.entry_exclude = QLineEdit()
+        self.entry_exclude.setPlaceholderText(".git; node_modules; __pycache__; *.tmp  (folders are not listed at all)")
+        top.addWidget(self.entry_exclude, 4, 1)
+        self.chk_skip_hidden = QCheckBox("Skip hidden/system")
+        top.addWidget(self.chk_skip_hidden, 4, 2, 1, 2)
+
+        top.addWidget(QLabel("Include:"), 5, 0)
+        self.entry_include = QLineEdit()
+        self.entry_include.setPlaceholderText("*.jpg; *.mp4  (blank = all files)")
+        top.addWidget(self.entry_include, 5, 1)
+        limits = QHBoxLayout()
+        limits.addWidget(QLabel("Min size:"))
+        self.entry_min_size = QLineEdit()
+        self.entry_min_size.setPlaceholderText("e.g. 100K")
+        limits.addWidget(self.entry_min_size)
+        limits.addWidget(QLabel("Max size:"))
+        self.entry_max_size = QLineEdit()
+        self.entry_max_size.setPlaceholderText("e.g. 4G")
+        limits.addWidget(self.entry_max_size)
+        limits.addWidget(QLabel("Max depth:"))
+        self.spin_max_depth = QSpinBox()
+        self.spin_max_depth.setRange(-1, 999)
+        self.spin_max_depth.setValue(-1)
+        self.spin_max_depth.setSpecialValueText("Unlimited")
+        limits.addWidget(self.spin_max_depth)
+        top.addLayout(limits, 5, 2, 1, 3)
+
         top.setColumnStretch(1, 1)
 
+        # Scan and verification options
+        options_box = QGroupBox("Options")
+        layout.addWidget(options_box)
+        options = QGridLayout(options_box)
+
+        options.addWidget(QLabel("Stage 1 (scan):"), 0, 0)
+        self.chk_auto_verify = QCheckBox("Auto-verify (hash candidates during Stage 1)")
+        options.addWidget(self.chk_auto_verify, 1, 0)
+        self.chk_a_index = QCheckBox("Remember Folder A index (re-list only changed folders)")
+        options.addWidget(self.chk_a_index, 2, 0)
+        self.chk_watch_a = QCheckBox("Watch Folder A (keep its index live between runs)")
+        self.chk_watch_a.toggled.connect(self._watch_toggled)
+        options.addWidget(self.chk_watch_a, 3, 0)
+
+        options.addWidget(QLabel("Stage 2 (verify):"), 0, 1)
+        self.chk_compare = QCheckBox("Compare bytes for single-candidate rows (stop at first difference)")
+        options.addWidget(self.chk_compare, 1, 1)
+        self.chk_processes = QCheckBox("Hash in separate processes (CPU-bound hashing on fast disks)")
+        options.addWidget(self.chk_processes, 2, 1)
+        self.chk_drop_cache = QCheckBox("Don't keep hashed files in the page cache (bulk runs on shared machines)")
+        options.addWidget(self.chk_drop_cache, 3, 1)
+        self.chk_prefilter = QCheckBox(
+            f"Fast pre-hash ({fast_algo()}): rule out differences cheaply, confirm matches with the hasher"
+        )
+        options.addWidget(self.chk_prefilter, 4, 1)
+        self.chk_all_digests = QCheckBox("Store every hasher's digest in one read (switch hashers without re-reading)")
+        options.addWidget(self.chk_all_digests, 5, 1)
+
         # Actions
         actions = QHBoxLayout()
         layout.addLayout(actions)
@@ -225,6 +398,11 @@ class App(QMainWindow):
         self.btn_quarantine.clicked.connect(self.quarantine_selected_matches)
         actions.addWidget(self.btn_quarantine)
 
+        self.btn_compact = QPushButton("Compact Hash Cache")
+        self.btn_compact.setToolTip("Drop cached hashes of files that were deleted or changed since they were hashed")
+        self.btn_compact.clicked.connect(self.compact_cache)
+        actions.addWidget(self.btn_compact)
+
         self.btn_pause = QPushButton("Pause")
         self.btn_pause.setEnabled(False)
         self.btn_pause.clicked.connect(self.toggle_pause)
@@ -326,6 +504,7 @@ class App(QMainWindow):
         layout.addWidget(self.log_box)
         self.log_box.toggled.connect(self.log_view.setVisible)
         self.log_view.setVisible(False)
+        self.watcher_log.connect(self.log_message)
 
     # -------------------- Helpers --------------------
     def set_status(self, text: str, pct: float | None = None):
@@ -337,47 +516,75 @@ class App(QMainWindow):
     def log_message(self, msg: str):
         self.log_view.append(msg)
 
+    ROW_COLORS = {
+        "MATCH": QColor("#d9f7be"),
+        "DIFF": QColor("#ffd6d6"),
+        "ERROR": QColor("#ffe7ba"),
+    }
+
+    def _row_visible(self, r: Candidate, search: str, status: str) -> bool:
+        if status != "All" and r["status"] != status:
+            return False
+        if search and search not in r["name"].lower():
+            return False
+        return True
+
+    def _fill_row(self, row: int, r: Candidate):
+        a_paths = r["a_paths"]
+        a_first = a_paths[0] if a_paths else ""
+        hash_b_short = (r["hash_b"][:16] + "…") if r.get("hash_b") else ""
+        values = [
+            r["status"],
+            r["name"],
+            human_size(r["size"]),
+            r.get("hash_algo") or "",
+            hash_b_short,
+            a_first,
+            r["path_b"],
+        ]
+        color = self.ROW_COLORS.get(r["status"])
+        for col, val in enumerate(values):
+            item = QTableWidgetItem(val)
+            if color is not None:
+                item.setBackground(color)
+            self.table.setItem(row, col, item)
+
     def refresh_table(self):
         search = self.search_box.text().lower()
         status = self.status_filter.currentText()
-        filtered = []
-        for idx, r in enumerate(self.candidates):
-            if status != "All" and r["status"] != status:
-                continue
-            if search and search not in r["name"].lower():
-                continue
-            filtered.append(idx)
+        filtered = [
+            idx for idx, r in enumerate(self.candidates) if self._row_visible(r, search, status)
+        ]
         self.displayed_rows = filtered
         self.table.setRowCount(len(filtered))
-        color_map = {
-            "MATCH": QColor("#d9f7be"),
-            "DIFF": QColor("#ffd6d6"),
-            "ERROR": QColor("#ffe7ba"),
-        }
         for row, idx in enumerate(filtered):
-            r = self.candidates[idx]
-            a_first = r["a_paths"][0] if r["a_paths"] else ""
-            hash_b_short = (r["hash_b"][:16] + "…") if r.get("hash_b") else ""
-            values = [
-                r["status"],
-                r["name"],
-                human_size(r["size"]),
-                r.get("hash_algo") or "",
-                hash_b_short,
-                a_first,
-                r["path_b"],
-            ]
-            for col, val in enumerate(values):
-                item = QTableWidgetItem(val)
-                if r["status"] in color_map:
-                    item.setBackground(color_map[r["status"]])
-                self.table.setItem(row, col, item)
+            self._fill_row(row, self.candidates[idx])
         self._on_selection_change()
 
+    def append_rows(self, rows: list[Candidate]):
+        """Add new candidates and show the visible ones without rebuilding the table."""
+        search = self.search_box.text().lower()
+        status = self.status_filter.currentText()
+        start = len(self.candidates)
+        self.candidates.extend(rows)
+        new = [
+            start + i for i, r in enumerate(rows) if self._row_visible(r, search, status)
+        ]
+        if not new:
+            return
+        row = self.table.rowCount()
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(row + len(new))
+        for idx in new:
+            self._fill_row(row, self.candidates[idx])
+            row += 1
+        self.table.setUpdatesEnabled(True)
+        self.displayed_rows.extend(new)
+
     def _on_selection_change(self):
         rows = self.table.selectionModel().selectedRows()
         indices = [self.displayed_rows[r.row()] for r in rows]
-        enable_verify = bool(indices) and bool(self.candidates)
+        enable_verify = bool(indices) and bool(self.candidates) and self.current_worker is None
         self.btn_verify_sel.setEnabled(enable_verify)
         any_match = any(self.candidates[i]["status"] == "MATCH" for i in indices)
         self.btn_delete.setEnabled(any_match)
@@ -416,6 +623,43 @@ class App(QMainWindow):
         if p:
             self.entry_q.setText(p)
 
+    def _ensure_watcher(self, folder_a: str) -> FolderWatcher:
+        w = self.a_watcher
+        if w is not None and w.index.root == folder_a and not w.stop_event.is_set():
+            return w
+        self._stop_watcher()
+        w = FolderWatcher(
+            FolderIndex(folder_a),
+            ui_log=self.watcher_log.emit,
+            workers=self.spin_workers.value(),
+        )
+        w.start()
+        self.a_watcher = w
+        return w
+
+    def _stop_watcher(self):
+        if self.a_watcher is not None:
+            self.a_watcher.stop()
+            self.a_watcher = None
+
+    def _watch_toggled(self, checked: bool):
+        if not checked:
+            self._stop_watcher()
+
+    def closeEvent(self, event):  # pragma: no cover - GUI event
+        self._stop_watcher()
+        worker = self.current_worker
+        if worker is not None:
+            worker.resume()
+            worker.stop()
+            # Let the run finish its current file so no put() lands after the cache is closed,
+            # and so Qt never destroys a running QThread
+            for name in ("stage1", "stage2", "compact"):
+                if getattr(self, f"{name}_worker", None) is worker:
+                    getattr(self, f"{name}_thread").wait()
+        HASH_CACHE.close()
+        super().closeEvent(event)
+
     def _stage1_stats_cb(self, d: dict):
         if "a_done" in d:
             self.label_a_done.setText(str(d["a_done"]))
@@ -427,8 +671,32 @@ class App(QMainWindow):
     def _stage1_progress_cb(self, text, pct):
         self.set_status(text, pct)
 
+    def _verify_opts(self) -> dict:
+        """Verifier keyword options from the controls (shared by Stage 2 and auto-verify)."""
+        return {
+            "strategy": "compare" if self.chk_compare.isChecked() else "hash",
+            "backend": "process" if self.chk_processes.isChecked() else "thread",
+            "fadvise": "bulk" if self.chk_drop_cache.isChecked() else "sequential",
+            "prefilter": self.chk_prefilter.isChecked(),
+            "also": self.algos if self.chk_all_digests.isChecked() else (),
+        }
+
+    def _walk_filter(self) -> WalkFilter:
+        """Build the traversal filters from the controls (ValueError on a bad size)."""
+        depth = self.spin_max_depth.value()
+        return WalkFilter(
+            include=WalkFilter.parse_globs(self.entry_include.text()),
+            exclude=WalkFilter.parse_globs(self.entry_exclude.text()),
+            min_size=parse_size(self.entry_min_size.text()),
+            max_size=parse_size(self.entry_max_size.text()),
+            max_depth=None if depth < 0 else depth,
+            skip_hidden=self.chk_skip_hidden.isChecked(),
+        )
+
     # -------------------- Stage 1 --------------------
     def start_stage1(self):
+        if self.current_worker is not None:  # e.g. a cache compaction is running
+            return
         fa, fb = self.entry_a.text().strip(), self.entry_b.text().strip()
         if not fa or not fb:
             QMessageBox.critical(self, "Missing folders", "Please choose both Folder A and Folder B.")
@@ -439,6 +707,11 @@ class App(QMainWindow):
         if os.path.abspath(fa) == os.path.abspath(fb):
             QMessageBox.critical(self, "Same folder", "Folder A and Folder B must be different.")
             return
+        try:
+            filters = self._walk_filter()
+        except ValueError:
+            QMessageBox.critical(self, "Invalid size", "Sizes must look like 500, 100K, 20MB or 4G.")
+            return
 
         # Clear table and state
         self.candidates.clear()
@@ -454,15 +727,25 @@ class App(QMainWindow):
         self.btn_delete.setEnabled(False)
         self.set_status("Stage 1: preparing…", 0.0)
 
-        worker = Stage1Worker(fa, fb)
+        auto_algo = self.algo_combo.currentText() if self.chk_auto_verify.isChecked() else None
+        watcher = self._ensure_watcher(fa) if self.chk_watch_a.isChecked() else None
+        worker = Stage1Worker(
+            fa, fb, self.spin_workers.value(), auto_algo, self.chk_a_index.isChecked(), watcher, filters,
+            self._verify_opts(),
+        )
         thread = QThread(self)
         worker.moveToThread(thread)
         thread.started.connect(worker.run)
         worker.progress.connect(self._stage1_progress_cb)
         worker.stats.connect(self._stage1_stats_cb)
+        worker.batch.connect(self._stage1_batch)
+        worker.counter.connect(self._stage2_counter_cb)
         worker.log.connect(self.log_message)
         worker.finished.connect(self._stage1_finished)
         worker.error.connect(self._stage1_error)
+        # Quit from the worker thread so thread.wait() cannot deadlock on the GUI thread
+        worker.finished.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+        worker.error.connect(thread.quit, Qt.ConnectionType.DirectConnection)
         thread.start()
         self.stage1_thread = thread
         self.stage1_worker = worker
@@ -471,7 +754,11 @@ class App(QMainWindow):
         self.btn_pause.setText("Pause")
         self.btn_stop.setEnabled(True)
 
-    def _stage1_finished(self, results: list[dict]):
+    def _stage1_batch(self, rows: list[Candidate]):
+        self.append_rows(rows)
+        self.label_candidates.setText(str(len(self.candidates)))
+
+    def _stage1_finished(self, found: int):
         thread = getattr(self, "stage1_thread", None)
         worker = getattr(self, "stage1_worker", None)
         if thread is not None:
@@ -484,17 +771,23 @@ class App(QMainWindow):
         self.btn_pause.setEnabled(False)
         self.btn_stop.setEnabled(False)
         self.current_worker = None
+        self.btn_verify_all.setEnabled(bool(self.candidates))
+        self._on_selection_change()
 
+        auto = getattr(worker, "auto_verify_algo", None)
+        if auto:
+            self.refresh_table()
         if getattr(worker, "stop_event", threading.Event()).is_set():
-            self.set_status("Stage 1 stopped.", None)
+            self.set_status(f"Stage 1 stopped: {len(self.candidates)} candidate(s) so far.", None)
             return
 
-        self.set_status(f"Stage 1 complete: {len(results)} candidate(s).", 1.0)
-        self.candidates = results
-        self.refresh_table()
-        enable = bool(results)
-        self.btn_verify_sel.setEnabled(False)
-        self.btn_verify_all.setEnabled(enable)
+        if auto:
+            self.set_status(
+                f"Stage 1 + auto-verify complete: {found} candidate(s), {self.label_v_matches.text()} match(es).",
+                1.0,
+            )
+        else:
+            self.set_status(f"Stage 1 complete: {found} candidate(s).", 1.0)
 
     def _stage1_error(self, msg: str):
         thread = getattr(self, "stage1_thread", None)
@@ -535,7 +828,9 @@ class App(QMainWindow):
         rows = [self.candidates[i] for i in pending_indices]
         self._run_verifier(rows)
 
-    def _run_verifier(self, rows_to_verify: list[dict]):
+    def _run_verifier(self, rows_to_verify: list[Candidate]):
+        if self.current_worker is not None:
+            return
         self.btn_verify_sel.setEnabled(False)
         self.btn_verify_all.setEnabled(False)
         self.btn_delete.setEnabled(False)
@@ -544,7 +839,9 @@ class App(QMainWindow):
             0.0,
         )
 
-        worker = Stage2Worker(self.algo_combo.currentText(), self.spin_workers.value(), rows_to_verify)
+        worker = Stage2Worker(
+            self.algo_combo.currentText(), self.spin_workers.value(), rows_to_verify, self._verify_opts()
+        )
         thread = QThread(self)
         worker.moveToThread(thread)
         thread.started.connect(worker.run)
@@ -553,6 +850,9 @@ class App(QMainWindow):
         worker.log.connect(self.log_message)
         worker.finished.connect(self._stage2_finished)
         worker.error.connect(self._stage2_error)
+        # Quit from the worker thread so thread.wait() cannot deadlock on the GUI thread
+        worker.finished.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+        worker.error.connect(thread.quit, Qt.ConnectionType.DirectConnection)
         thread.start()
         self.stage2_thread = thread
         self.stage2_worker = worker
@@ -581,7 +881,6 @@ class App(QMainWindow):
             self.refresh_table()
             self.set_status(f"Stage 2 complete: verified {done}, matches {matches}.", 1.0)
             self.btn_verify_all.setEnabled(True)
-            HASH_CACHE.save()
 
     def _stage2_error(self, msg: str):
         thread = getattr(self, "stage2_thread", None)
@@ -598,6 +897,48 @@ class App(QMainWindow):
         self.current_worker = None
         QMessageBox.critical(self, "Stage 2 failed", msg)
 
+    # -------------------- Cache maintenance --------------------
+    def compact_cache(self):
+        if self.current_worker is not None:
+            return
+        for btn in (self.btn_compact, self.btn_stage1, self.btn_verify_sel, self.btn_verify_all):
+            btn.setEnabled(False)
+        self.set_status("Compacting hash cache…", 0.0)
+        worker = CompactWorker(self.spin_workers.value())
+        thread = QThread(self)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.progress.connect(self.set_status)
+        worker.finished.connect(self._compact_finished)
+        worker.error.connect(self._compact_error)
+        worker.finished.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+        worker.error.connect(thread.quit, Qt.ConnectionType.DirectConnection)
+        thread.start()
+        self.compact_thread = thread
+        self.compact_worker = worker
+        self.current_worker = worker
+        self.btn_stop.setEnabled(True)
+
+    def _compact_done(self):
+        thread = self.compact_thread
+        thread.wait()
+        self.compact_worker.deleteLater()
+        thread.deleteLater()
+        self.btn_stop.setEnabled(False)
+        self.btn_compact.setEnabled(True)
+        self.btn_stage1.setEnabled(True)
+        self.current_worker = None
+        self.btn_verify_all.setEnabled(bool(self.candidates.pending()))
+        self._on_selection_change()
+
+    def _compact_finished(self, removed: int):
+        self._compact_done()
+        self.set_status(f"Hash cache compacted: removed {removed} stale entries.", 1.0)
+
+    def _compact_error(self, msg: str):
+        self._compact_done()
+        QMessageBox.critical(self, "Compact failed", msg)
+
     # -------------------- Deletion --------------------
     def delete_selected_matches(self):
         rows = sorted({self.displayed_rows[r.row()] for r in self.table.selectionModel().selectedRows()}, reverse=True)
@@ -690,6 +1031,7 @@ def main():  # pragma: no cover - UI entry point
     app = QApplication(sys.argv)
     win = App()
     win.show()
+    HASH_CACHE.open_in_background()  # migration of an old JSON cache must not delay the window
     app.exec()
 
 
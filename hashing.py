@@ -1,70 +1,859 @@
+import atexit
+import errno
 import os
 import json
+import mmap
+import sqlite3
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from platformdirs import user_cache_dir
-
-from utils import to_long_path, new_hasher, READ_CHUNK
+from utils import cache_dir, to_long_path, new_hasher, READ_CHUNK
 
 
 def _cache_path() -> Path:
-    cache_dir = Path(user_cache_dir("DedupeUI"))
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    return cache_dir / "hash_cache.json"
+    return cache_dir() / "hash_cache.sqlite3"
 
 # ================== Hash Cache ==================
 class HashCache:
-    """JSON cache keyed by (path,size,mtime_ns,algo)."""
-    def __init__(self):
-        self.path = _cache_path()
-        self.data = {}
+    """
+    SQLite (WAL) cache of digests keyed by (path, algo) and valid while size and mtime_ns match.
+    Bounded by max_entries, and safe to share between processes.
+    """
+    VERSION = 5  # schema version (PRAGMA user_version)
+    LEGACY_VERSION = 1  # key suffix ("|v1") of the JSON caches that can be imported
+    FLUSH_EVERY = 512  # puts are written in batches of this many, in one transaction
+    MAX_ENTRIES = 2_000_000
+    CHECKPOINT_SECONDS = 5.0  # unsaved puts are flushed at least this often
+    EVICT_TO = 0.9  # share of max_entries kept once it is exceeded
+    SCHEMA = (  # directory strings are stored once, digests as raw bytes
+        # AUTOINCREMENT: ids are never reused after compact(), as other processes memoize them
+        "CREATE TABLE IF NOT EXISTS dirs (id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL UNIQUE)",
+        """CREATE TABLE IF NOT EXISTS digests (
+            dir INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            algo TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest BLOB NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            dev INTEGER NOT NULL DEFAULT 0,
+            ino INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dir, name, algo)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS digests_inode ON digests (ino, dev, size, mtime_ns) WHERE ino != 0",
+        "CREATE INDEX IF NOT EXISTS digests_used ON digests (used)",  # LRU order for _evict()
+    )
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        max_entries: int | None = MAX_ENTRIES,
+        checkpoint_seconds: float | None = CHECKPOINT_SECONDS,
+    ):
+        self.path = Path(path) if path else None  # resolved on first use
+        self.max_entries = max_entries
+        self.checkpoint_seconds = checkpoint_seconds
+        self._checkpointer: threading.Thread | None = None
+        self._closing = threading.Event()
+        self._exit_hook = False
+        self._count = 0  # upper bound on the stored entries, see _evict()
+        self.lock = threading.Lock()  # guards the pending batches and the dir-id memo
+        self._write_lock = threading.Lock()  # one writing transaction at a time
+        self._open_lock = threading.Lock()
+        self._ready = False
+        self._local = threading.local()
+        self._pending: dict[tuple, tuple] = {}  # (dir, name, algo) -> (size, mtime_ns, digest bytes, dev, ino)
+        self._flushing: dict[tuple, tuple] = {}  # batch being committed; still visible to get()
+        self._touched: set[tuple] = set()  # (dir, name, algo) hit since the last flush
+        self._dir_ids: dict[str, int] = {}
+        self._connections = []
+        self._uncached = False  # the database could not be opened: run without a cache
+
+    def _open(self):
+        """Create or reset the schema and import a legacy JSON cache (first use only)."""
+        if self.path is None:
+            self.path = _cache_path()
+        con = self._connect()
+        if con.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            with con:
+                con.execute("BEGIN IMMEDIATE")
+                # read again under the write lock: another process may have just set it up
+                version = con.execute("PRAGMA user_version").fetchone()[0]
+                if version != self.VERSION:
+                    # no migrations: a cache from another version is dropped and rebuilt
+                    con.execute("DROP TABLE IF EXISTS digests")
+                    con.execute("DROP TABLE IF EXISTS dirs")
+                    for statement in self.SCHEMA:
+                        con.execute(statement)
+                    con.execute(f"PRAGMA user_version = {self.VERSION}")
+        self._count = con.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+        self._import_json(con, self.path.with_suffix(".json"))
+        self._ready = True
+
+    def ensure_open(self):
+        """
+        Open the database now; callers racing a background open wait for it here. Nothing is
+        opened at construction, so importing this module costs no I/O.
+        """
+        if not self._ready:
+            with self._open_lock:
+                if not self._ready:
+                    try:
+                        self._open()
+                    except sqlite3.OperationalError:
+                        self._run_uncached()  # e.g. a read-only or missing cache directory
+                    except (sqlite3.DatabaseError, OSError):
+                        self._recreate()
+
+    def _recreate(self):
+        """The file is not a usable database: move it aside as *.corrupt and start afresh."""
+        self._close_connections()
+        try:
+            if self.path is None:
+                raise OSError("no cache directory")
+            self.path.replace(self.path.with_name(self.path.name + ".corrupt"))
+            for suffix in ("-wal", "-shm"):
+                self.path.with_name(self.path.name + suffix).unlink(missing_ok=True)
+            self._open()
+        except (sqlite3.DatabaseError, OSError):
+            self._run_uncached()
+
+    def _run_uncached(self):
+        """Lookups miss and puts are dropped until close(); hashing goes on without a cache."""
+        self._close_connections()
+        with self.lock:
+            self._pending.clear()
+            self._touched.clear()
+        self._uncached = True
+        self._ready = True
+
+    def open_in_background(self) -> threading.Thread:
+        """
+        Start opening the cache (and migrating an old JSON file) off the calling thread,
+        e.g. once the window is shown. Lookups made before it finishes block until it does.
+        """
+        def run():
+            try:
+                self.ensure_open()
+            finally:
+                self.release_thread()
+
+        t = threading.Thread(target=run, name="hash-cache-open", daemon=True)
+        t.start()
+        return t
+
+    def _connect(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+            with self.lock:
+                self._connections.append(con)
+        return con
+
+    def _con(self) -> sqlite3.Connection | None:
+        """
+        This thread's connection (sqlite3 connections must not be shared between threads),
+        or None when running uncached.
+        """
+        if not self._ready:
+            self.ensure_open()
+        return None if self._uncached else self._connect()
+
+    def release_thread(self):
+        """
+        Close the calling thread's connection. Threads that used the cache call this before
+        they exit, so connections don't pile up over many runs; the next use reconnects.
+        """
+        con = getattr(self._local, "con", None)
+        if con is None:
+            return
+        self._local.con = None
+        with self.lock:
+            if con in self._connections:
+                self._connections.remove(con)
+        con.close()
+
+    def _close_connections(self):
+        with self.lock:
+            cons, self._connections = self._connections, []
+        for con in cons:
+            con.close()
+        self._local = threading.local()
+
+    @staticmethod
+    def _json_rows(raw):
+        """Yield (dir, name, algo, size, mtime_ns, digest bytes) from the legacy JSON cache
+        ({"path|size|mtime_ns|algo|v1": hex}), skipping malformed entries one by one."""
+        if not isinstance(raw, dict):
+            return
+        tag = f"v{HashCache.LEGACY_VERSION}"
+        for k, digest in raw.items():
+            try:
+                path, size, mtime_ns, algo, version = k.rsplit("|", 4)
+                if version != tag:
+                    continue
+                d, name = os.path.split(path)
+                yield d, name, algo, int(size), int(mtime_ns), bytes.fromhex(digest)
+            except (ValueError, TypeError, AttributeError):
+                continue
+
+    def _import_json(self, con: sqlite3.Connection, legacy: Path):
+        """Import a hash_cache.json written by older versions and rename it to *.json.migrated."""
+        if not legacy.exists():
+            return
+        try:
+            with legacy.open("r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            raw = None  # unreadable: nothing to import, but don't retry on every start
+        with self.lock:
+            for d, name, algo, size, mtime_ns, digest in self._json_rows(raw):
+                # puts made while the import ran are newer than the legacy file
+                self._pending.setdefault((d, name, algo), (size, mtime_ns, digest, 0, 0))
+        self._flush(con, replace=False)  # another process may be importing the same file
         try:
-            if self.path.exists():
-                with self.path.open("r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-        except Exception:
-            self.data = {}
-        self.lock = threading.Lock()
-        self.version = 1
+            legacy.replace(legacy.with_suffix(".json.migrated"))
+        except OSError:
+            pass  # already moved by another process
 
-    def _key(self, path: str, size: int, mtime_ns: int, algo: str):
-        return f"{path}|{size}|{mtime_ns}|{algo}|v{self.version}"
+    def _dir_id(self, con: sqlite3.Connection, d: str) -> int | None:
+        i = self._dir_ids.get(d)
+        if i is None:
+            row = con.execute("SELECT id FROM dirs WHERE path = ?", (d,)).fetchone()
+            if row is None:
+                return None
+            i = row[0]
+            with self.lock:
+                self._dir_ids[d] = i
+        return i
 
-    def get(self, path: str, size: int, mtime_ns: int, algo: str):
-        return self.data.get(self._key(path, size, mtime_ns, algo))
+    def __len__(self) -> int:
+        """Entries stored in the database; buffered puts count once saved (read-only)."""
+        con = self._con()
+        return con.execute("SELECT COUNT(*) FROM digests").fetchone()[0] if con else 0
 
-    def put(self, path: str, size: int, mtime_ns: int, algo: str, digest: str):
+    def get(self, path: str, size: int, mtime_ns: int, algo: str, inode: tuple[int, int] | None = None):
+        """
+        Cached hex digest or None. A hit records when the entry was last used (written with the
+        next batch) for eviction. With `inode` (see inode_of), a path miss falls back to the
+        file's identity, so a file moved or renamed within its file system is still a hit.
+        """
+        if not self._ready:
+            self.ensure_open()
+        if self._uncached:
+            return None
+        d, name = os.path.split(path)
+        key = (d, name, algo)
         with self.lock:
-            self.data[self._key(path, size, mtime_ns, algo)] = digest
+            hit = self._pending.get(key) or self._flushing.get(key)
+        if hit is None:
+            con = self._con()
+            dir_id = self._dir_id(con, d)
+            if dir_id is not None:
+                hit = con.execute(
+                    "SELECT size, mtime_ns, digest FROM digests WHERE dir = ? AND name = ? AND algo = ?",
+                    (dir_id, name, algo),
+                ).fetchone()
+        if hit is None or hit[0] != size or hit[1] != mtime_ns:
+            # unknown path, or the file changed since it was hashed: try the file's identity
+            return self._get_inode(path, size, mtime_ns, algo, inode)
+        with self.lock:
+            self._touched.add(key)
+            full = len(self._touched) >= 8 * self.FLUSH_EVERY
+        if full:
+            self.save()
+        return hit[2].hex()
+
+    # "ino != 0" repeats the partial index's condition, without which SQLite won't use it
+    _INODE_LOOKUP = (
+        "SELECT digest FROM digests "
+        "WHERE ino = ? AND ino != 0 AND dev = ? AND size = ? AND mtime_ns = ? AND algo = ? LIMIT 1"
+    )
+
+    def _get_inode(self, path: str, size: int, mtime_ns: int, algo: str, inode: tuple[int, int] | None):
+        if not inode or not inode[1]:
+            return None
+        entry = (size, mtime_ns)
+        with self.lock:  # entries not flushed yet (a small batch)
+            row = next(
+                ((v[2],) for k, v in (*self._pending.items(), *self._flushing.items())
+                 if k[2] == algo and v[:2] == entry and v[3:] == inode),
+                None,
+            )
+        if row is None:
+            row = self._con().execute(self._INODE_LOOKUP, (inode[1], inode[0], size, mtime_ns, algo)).fetchone()
+        if row is None:
+            return None
+        digest = row[0].hex()
+        self.put(path, size, mtime_ns, algo, digest, inode)  # moved or renamed: remember the new path
+        return digest
+
+    def put(self, path: str, size: int, mtime_ns: int, algo: str, digest: str, inode: tuple[int, int] | None = None):
+        """
+        Buffer a digest; whichever thread fills the batch writes it. The path's digests for other
+        algorithms at a different size/mtime are dropped, so a modified file leaves nothing stale.
+        """
+        if self._uncached:
+            return
+        d, name = os.path.split(path)
+        dev, ino = inode or (0, 0)
+        with self.lock:
+            self._pending[(d, name, algo)] = (size, mtime_ns, bytes.fromhex(digest), dev, ino)
+            full = len(self._pending) >= self.FLUSH_EVERY
+            start = self._checkpointer is None and bool(self.checkpoint_seconds)
+            if start:
+                self._checkpointer = threading.Thread(target=self._checkpoint, name="hash-cache-checkpoint", daemon=True)
+        if start:
+            self._closing.clear()
+            self._checkpointer.start()
+            if not self._exit_hook:
+                atexit.register(self.save)
+                self._exit_hook = True
+        if full:
+            self.save()
+
+    def _checkpoint(self):
+        """Flush every checkpoint_seconds while puts arrive, so a crash loses at most that much work."""
+        try:
+            while not self._closing.wait(self.checkpoint_seconds):
+                try:
+                    self.save()
+                except Exception:
+                    pass  # e.g. the cache directory went away; the next put or save() retries
+        finally:
+            self.release_thread()
+
+    def drop_paths(self, paths) -> int:
+        """Forget every cached digest for the given paths (any size/mtime/algo)."""
+        self.save()
+        con = self._con()
+        if con is None:
+            return 0
+        dropped = 0
+        with self._write_lock, con:
+            con.execute("BEGIN IMMEDIATE")
+            for p in paths:
+                d, name = os.path.split(to_long_path(p))
+                dir_id = self._dir_id(con, d)
+                if dir_id is not None:
+                    dropped += con.execute("DELETE FROM digests WHERE dir = ? AND name = ?", (dir_id, name)).rowcount
+        return dropped
+
+    def clear(self):
+        with self.lock:
+            self._pending.clear()
+            self._touched.clear()
+        con = self._con()
+        if con is None:
+            return
+        with self._write_lock, con:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute("DELETE FROM digests")
+            self._count = 0
 
     def save(self):
+        """Write buffered puts and last-use times in one transaction."""
+        if self._pending or self._touched:
+            con = self._con()
+            if con is not None:  # _run_uncached() dropped the buffer otherwise
+                self._flush(con)
+
+    def _flush(self, con: sqlite3.Connection, replace: bool = True):
+        """
+        Upsert the batch in one BEGIN IMMEDIATE transaction (waiting up to 30 s for another
+        process's), so processes sharing the file never overwrite each other wholesale.
+        """
+        with self._write_lock:
+            with self.lock:
+                if not (self._pending or self._touched):
+                    return
+                batch, self._pending = self._pending, {}
+                touched, self._touched = self._touched, set()
+                self._flushing = batch
+            now = time.time_ns()
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                try:
+                    # resolved afresh: compact() in another process may have dropped a memoized dir
+                    dir_ids = {}
+                    for d, _, _ in batch:
+                        if d not in dir_ids:
+                            con.execute("INSERT OR IGNORE INTO dirs (path) VALUES (?)", (d,))
+                            dir_ids[d] = con.execute("SELECT id FROM dirs WHERE path = ?", (d,)).fetchone()[0]
+                    rows = [(dir_ids[d], name, algo, *entry) for (d, name, algo), entry in batch.items()]
+                    if replace:
+                        # other algorithms' digests from an older version of the file are superseded
+                        con.executemany(
+                            "DELETE FROM digests WHERE dir = ? AND name = ? AND (size != ? OR mtime_ns != ?)",
+                            [(r[0], r[1], r[3], r[4]) for r in rows],
+                        )
+                    con.executemany(
+                        f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO digests "
+                        "(dir, name, algo, size, mtime_ns, digest, dev, ino, used) "
+                        f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, {now})",
+                        rows,
+                    )
+                    used = [(now, self._dir_ids[d], name, algo) for d, name, algo in touched if d in self._dir_ids]
+                    con.executemany("UPDATE digests SET used = ? WHERE dir = ? AND name = ? AND algo = ?", used)
+                    self._count += len(rows)
+                    self._evict(con)
+                    con.execute("COMMIT")
+                    with self.lock:
+                        self._dir_ids.update(dir_ids)
+                except BaseException:
+                    con.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error:
+                with self.lock:
+                    for k, v in batch.items():
+                        self._pending.setdefault(k, v)  # retry with the next flush
+            finally:
+                with self.lock:
+                    self._flushing = {}
+
+    def _evict(self, con: sqlite3.Connection):
+        """Drop least recently used entries once the budget is exceeded (inside a flush)."""
+        if self.max_entries is None or self._count <= self.max_entries:
+            return
+        self._count = con.execute("SELECT COUNT(*) FROM digests").fetchone()[0]  # puts may have replaced rows
+        excess = self._count - int(self.max_entries * self.EVICT_TO)
+        if self._count > self.max_entries and excess > 0:
+            con.execute(
+                "DELETE FROM digests WHERE (dir, name, algo) IN "
+                "(SELECT dir, name, algo FROM digests ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+            self._count -= excess
+
+    def compact(self, workers: int = 8, batch: int = 2048, ui_progress=None, stop_event=None) -> int:
+        """
+        Remove entries whose file no longer exists or no longer has the cached size/mtime,
+        stat-ing a batch of paths at a time on `workers` threads. Returns the entries removed.
+        """
+        self.save()
+        con = self._con()
+        if con is None:
+            return 0
+        total = con.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+        cur = con.execute(
+            "SELECT d.id, d.path, g.name, g.size, g.mtime_ns FROM digests g JOIN dirs d ON d.id = g.dir"
+        )
+
+        def stale(row) -> bool:
+            try:
+                st = os.stat(os.path.join(row[1], row[2]))
+            except (FileNotFoundError, NotADirectoryError):
+                return True
+            except OSError:
+                return False  # unreadable or offline: keep it
+            return st.st_size != row[3] or int(st.st_mtime_ns) != row[4]
+
+        doomed = []  # (dir id, name, size, mtime_ns)
+        seen = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+            while not (stop_event and stop_event.is_set()):
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                doomed.extend((r[0], r[2], r[3], r[4]) for r, bad in zip(rows, ex.map(stale, rows)) if bad)
+                seen += len(rows)
+                if ui_progress:
+                    ui_progress(f"Compacting hash cache: checked {seen}/{total}, stale {len(doomed)}", seen / max(1, total))
+        cur.close()
+        with self._write_lock, con:
+            con.execute("BEGIN IMMEDIATE")
+            removed = sum(
+                con.execute(
+                    "DELETE FROM digests WHERE dir = ? AND name = ? AND size = ? AND mtime_ns = ?", key
+                ).rowcount
+                for key in doomed
+            )
+            con.execute("DELETE FROM dirs WHERE id NOT IN (SELECT DISTINCT dir FROM digests)")
+            self._count = con.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+            with self.lock:
+                self._dir_ids.clear()
         try:
-            tmp = self.path.with_suffix(".tmp")
-            with tmp.open("w", encoding="utf-8") as f:
-                json.dump(self.data, f)
-            tmp.replace(self.path)
-        except Exception:
-            pass
+            con.execute("VACUUM")  # give the freed pages back to the file system
+        except sqlite3.OperationalError:
+            pass  # another connection is busy; the space is reused by later inserts
+        return removed
+
+    def close(self):
+        """Flush and close every connection; the next use opens the database (at .path) again."""
+        self._closing.set()
+        t, self._checkpointer = self._checkpointer, None
+        if t is not None and t is not threading.current_thread():
+            t.join()
+        self.save()
+        self._close_connections()
+        with self.lock:
+            self._dir_ids.clear()
+        self._uncached = False
+        self._ready = False
 
 HASH_CACHE = HashCache()
 
-def file_digest(path: str, algo: str) -> tuple[str, int]:
-    """Return (hex_digest, size) with caching on (path,size,mtime,algo)."""
+_SQLITE_INT_MAX = (1 << 63) - 1
+
+
+def inode_of(st) -> tuple[int, int] | None:
+    """(st_dev, st_ino) for HashCache lookups, or None when the platform gives no usable inode."""
+    if not st.st_ino or st.st_ino > _SQLITE_INT_MAX or st.st_dev > _SQLITE_INT_MAX:
+        return None
+    return st.st_dev, st.st_ino
+
+# ================== Read Loop ==================
+_read_buffers = threading.local()
+
+
+def read_buffer(size: int = READ_CHUNK) -> bytearray:
+    """This thread's reusable read buffer (allocated once per thread and size)."""
+    buf = getattr(_read_buffers, "buf", None)
+    if buf is None or len(buf) != size:
+        buf = _read_buffers.buf = bytearray(size)
+    return buf
+
+
+_ZEROS = bytes(READ_CHUNK)  # fed to hashers in place of sparse-file holes
+
+
+def _is_sparse(st) -> bool:
+    return hasattr(os, "SEEK_DATA") and getattr(st, "st_blocks", None) is not None and st.st_blocks * 512 < st.st_size
+
+
+def _feed_zeros(h, n: int):
+    zeros = memoryview(_ZEROS)
+    while n > 0:
+        k = min(n, len(_ZEROS))
+        h.update(zeros[:k])
+        n -= k
+
+
+def _hash_sparse(f, h, size: int, buf: bytearray) -> int | None:
+    """
+    Hash a sparse file region by region: data extents are read, holes (found with
+    SEEK_DATA/SEEK_HOLE) are fed to the hasher as zeros without touching the disk.
+    Returns the bytes actually read, or None if the filesystem cannot report holes.
+    """
+    fd = f.fileno()
+    view = memoryview(buf)
+    pos = 0
+    read = 0
+    while pos < size:
+        try:
+            data = os.lseek(fd, pos, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:  # only a hole is left
+                data = size
+            elif pos == 0:
+                return None  # SEEK_DATA unsupported here; nothing hashed yet
+            else:
+                raise
+        data = min(data, size)
+        _feed_zeros(h, data - pos)
+        if data >= size:
+            break
+        end = min(os.lseek(fd, data, os.SEEK_HOLE), size)
+        os.lseek(fd, data, os.SEEK_SET)
+        remaining = end - data
+        while remaining > 0:
+            n = f.readinto(view[:min(remaining, len(buf))])
+            if not n:
+                raise OSError(errno.EIO, "file shrank while hashing", f.name)
+            h.update(view[:n])
+            remaining -= n
+            read += n
+        pos = end
+    return read
+
+
+# ================== I/O Hints ==================
+# "off": no hints. "sequential": ask for aggressive readahead (SEQUENTIAL, plus WILLNEED for the
+# next chunk while the current one is hashed). "bulk": as sequential, and drop each file's pages
+# from the page cache (DONTNEED) once hashed, so a large verify run does not evict everything
+# else on the machine. posix_fadvise is POSIX-only; elsewhere every policy behaves like "off".
+FADVISE_POLICIES = ("off", "sequential", "bulk")
+FADVISE_DEFAULT = "sequential"
+
+
+def _advise(fd: int, offset: int, length: int, advice: str):
+    flag = getattr(os, advice, None)
+    if flag is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, flag)
+    except OSError:
+        pass  # advisory only
+
+
+def hash_stream(path: str, h, chunk: int = READ_CHUNK, fadvise: str = FADVISE_DEFAULT) -> int:
+    """
+    Feed a whole file to hasher `h` with readinto() on this thread's preallocated buffer, so the
+    loop allocates nothing per chunk (f.read() would create a fresh `chunk`-sized bytes object
+    each time). Sparse files on filesystems with SEEK_DATA/SEEK_HOLE (Linux) have their holes
+    hashed as zeros without reading them. `fadvise` is one of FADVISE_POLICIES.
+    Returns the number of bytes read from the file.
+    """
+    buf = read_buffer(chunk)
+    view = memoryview(buf)
+    total = 0
+    hints = fadvise != "off"
+    drop = fadvise == "bulk"
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        st = os.fstat(fd)
+        if hints:
+            _advise(fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+        try:
+            if _is_sparse(st):
+                read = _hash_sparse(f, h, st.st_size, buf)
+                if read is not None:
+                    return read
+                f.seek(0)
+            while True:
+                if hints:
+                    _advise(fd, total + chunk, chunk, "POSIX_FADV_WILLNEED")
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(buf if n == chunk else view[:n])
+                if drop:
+                    _advise(fd, total, n, "POSIX_FADV_DONTNEED")
+                total += n
+        finally:
+            if drop:
+                _advise(fd, 0, 0, "POSIX_FADV_DONTNEED")
+    return total
+
+
+# ================== Large Files ==================
+LARGE_FILE_MIN = 256 * 1024 * 1024  # files this big are memory-mapped (and multithreaded with blake3)
+
+
+class ThreadBudget:
+    """
+    Spare CPU threads shared by a hashing pool. A worker hashing a large file borrows what is
+    free for blake3's internal threads and returns it afterwards; workers that run out of rows
+    give their own thread back, so the last big files of a run can use the idle cores while the
+    total number of busy threads stays at the budget the pool started with.
+    """
+    def __init__(self, spare: int):
+        self._spare = max(0, spare)
+        self._lock = threading.Lock()
+
+    @property
+    def spare(self) -> int:
+        return self._spare
+
+    def take(self, want: int) -> int:
+        with self._lock:
+            n = min(max(0, want), self._spare)
+            self._spare -= n
+            return n
+
+    def give(self, n: int):
+        with self._lock:
+            self._spare += n
+
+
+class MultiHasher:
+    """Feed one read pass to several hashers (one per algo)."""
+    def __init__(self, algos, threads: int = 1):
+        self.hashers = {a: new_hasher(a, threads) for a in algos}
+
+    def update(self, data):
+        for h in self.hashers.values():
+            h.update(data)
+
+    def hexdigests(self) -> dict[str, str]:
+        return {a: h.hexdigest().lower() for a, h in self.hashers.items()}
+
+
+def _hash_large(lp: str, algos, budget: ThreadBudget | None, fadvise: str = FADVISE_DEFAULT) -> MultiHasher:
+    """Hash a big file through mmap: no copy into Python buffers, and blake3 may use extra threads."""
+    extra = budget.take((os.cpu_count() or 1) - 1) if budget is not None else 0
+    try:
+        mh = MultiHasher(algos, threads=1 + extra)
+        only = next(iter(mh.hashers.values())) if len(mh.hashers) == 1 else None
+        if hasattr(only, "update_mmap"):
+            only.update_mmap(lp)
+        else:
+            # Several hashers walk the same mapping, so the file still comes off the disk once
+            with open(lp, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if fadvise != "off" and hasattr(m, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    m.madvise(mmap.MADV_SEQUENTIAL)
+                mh.update(m)
+        return mh
+    finally:
+        if extra:
+            budget.give(extra)
+        if fadvise == "bulk":
+            with open(lp, "rb") as f:
+                _advise(f.fileno(), 0, 0, "POSIX_FADV_DONTNEED")
+
+
+def _hash_uncached(
+    lp: str, algos, size: int, budget: ThreadBudget | None, large_min: int, fadvise: str = FADVISE_DEFAULT
+) -> dict[str, str]:
+    mh = None
+    if size and size >= large_min and not _is_sparse(os.stat(lp)):
+        try:
+            mh = _hash_large(lp, algos, budget, fadvise)
+        except (OSError, ValueError, OverflowError):
+            mh = None  # e.g. a filesystem without mmap support or a 32-bit address space
+    if mh is None:
+        mh = MultiHasher(algos)
+        hash_stream(lp, mh, fadvise=fadvise)
+    return mh.hexdigests()
+
+
+def hash_file(
+    path: str, algos, large_min: int = LARGE_FILE_MIN, fadvise: str = FADVISE_DEFAULT
+) -> tuple[dict[str, str], int, int, tuple[int, int] | None]:
+    """
+    Hash one file with every algo in `algos` in a single pass, without touching the cache;
+    returns ({algo: hex_digest}, size, mtime_ns, inode) from one stat, so the parent caches
+    an identity that belongs to the bytes hashed. This is the unit of work sent to a process
+    pool; the parent records the result.
+    """
+    lp = to_long_path(path)
+    st = os.stat(lp)
+    digests = _hash_uncached(lp, tuple(algos), st.st_size, None, large_min, fadvise)
+    return digests, st.st_size, int(st.st_mtime_ns), inode_of(st)
+
+
+def file_digest(
+    path: str,
+    algo: str,
+    budget: ThreadBudget | None = None,
+    large_min: int = LARGE_FILE_MIN,
+    pool=None,
+    fadvise: str = FADVISE_DEFAULT,
+    also=(),
+) -> tuple[str, int]:
+    """
+    Return (hex_digest, size) with caching on (path,size,mtime,algo).
+    On a cache miss the algos in `also` are computed in the same read pass and cached too,
+    so switching hashers later (or exporting another digest) needs no new read.
+    Files of at least `large_min` bytes are hashed from a memory map, borrowing idle threads
+    from `budget` for blake3; smaller ones, or if mapping fails, are read in chunks.
+    With `pool` (a concurrent.futures executor, typically processes) a cache miss is hashed
+    by hash_file in the pool and the result is cached here. `fadvise` picks the page-cache
+    policy (see FADVISE_POLICIES).
+    """
     lp = to_long_path(path)
     st = os.stat(lp)
     size = st.st_size
     mtime_ns = int(st.st_mtime_ns)
-    cached = HASH_CACHE.get(lp, size, mtime_ns, algo)
+    inode = inode_of(st)
+    cached = HASH_CACHE.get(lp, size, mtime_ns, algo, inode)
+    if cached:
+        return cached, size
+    algos = (algo,) + tuple(a for a in dict.fromkeys(also) if a != algo)
+    if pool is not None:
+        digests, size, mtime_ns, inode = pool.submit(hash_file, lp, algos, large_min, fadvise).result()
+    else:
+        digests = _hash_uncached(lp, algos, size, budget, large_min, fadvise)
+    for a, d in digests.items():
+        HASH_CACHE.put(lp, size, mtime_ns, a, d, inode)
+    return digests[algo], size
+
+# ================== Partial Hash ==================
+PARTIAL_SAMPLE = 64 * 1024  # bytes read at each of head, middle and tail
+PARTIAL_MIN_SIZE = 1024 * 1024  # below this a full hash costs about the same
+
+
+def cached_digest(path: str, algo: str) -> str | None:
+    """Full digest from the cache if the file is unchanged since it was hashed (one stat, no read)."""
+    lp = to_long_path(path)
+    st = os.stat(lp)
+    return HASH_CACHE.get(lp, st.st_size, int(st.st_mtime_ns), algo, inode_of(st))
+
+
+def partial_digest(path: str, algo: str, sample: int = PARTIAL_SAMPLE) -> tuple[str, int]:
+    """
+    Return (hex_digest, size) of the first, middle and last `sample` bytes only: a cheap
+    fingerprint that tells most same-size files apart. Equal fingerprints prove nothing, so
+    a MATCH still needs file_digest. Cached under its own algo tag ("<algo>-head<sample>").
+    """
+    lp = to_long_path(path)
+    st = os.stat(lp)
+    size = st.st_size
+    mtime_ns = int(st.st_mtime_ns)
+    tag = f"{algo}-head{sample}"
+    cached = HASH_CACHE.get(lp, size, mtime_ns, tag, inode_of(st))
     if cached:
         return cached, size
     h = new_hasher(algo)
-    with open(lp, "rb", buffering=READ_CHUNK) as f:
-        while True:
-            b = f.read(READ_CHUNK)
-            if not b:
-                break
-            h.update(b)
+    with open(lp, "rb", buffering=0) as f:
+        if size <= 3 * sample:
+            h.update(f.read())
+        else:
+            for off in (0, (size // 2 - sample // 2) & ~4095, size - sample):
+                f.seek(off)
+                h.update(f.read(sample))
     digest = h.hexdigest().lower()
-    HASH_CACHE.put(lp, size, mtime_ns, algo, digest)
+    HASH_CACHE.put(lp, size, mtime_ns, tag, digest, inode_of(st))
     return digest, size
+
+# ================== Byte Compare ==================
+COMPARE_CHUNK = 1024 * 1024
+_compare_buffers = threading.local()
+
+
+def _read_full(f, buf: bytearray) -> int:
+    """readinto until buf is full or EOF; returns the byte count."""
+    view = memoryview(buf)
+    n = 0
+    while n < len(buf):
+        got = f.readinto(view[n:])
+        if not got:
+            break
+        n += got
+    return n
+
+
+def compare_files(path_a: str, path_b: str, algo: str | None = None, chunk: int = COMPARE_CHUNK) -> tuple[bool, str | None]:
+    """
+    Read two files side by side and stop at the first differing block.
+    Returns (equal, digest). With `algo`, the bytes of an equal pair are also fed to one hasher
+    and the digest is stored in HASH_CACHE for both paths, so later runs need no read at all.
+    Each thread reuses its own pair of `chunk`-sized buffers.
+    """
+    la, lb = to_long_path(path_a), to_long_path(path_b)
+    sa, sb = os.stat(la), os.stat(lb)
+    if sa.st_size != sb.st_size:
+        return False, None
+    bufs = getattr(_compare_buffers, "bufs", None)
+    if bufs is None or len(bufs[0]) != chunk:
+        bufs = _compare_buffers.bufs = (bytearray(chunk), bytearray(chunk))
+    ba, bb = bufs
+    h = new_hasher(algo) if algo else None
+    with open(la, "rb", buffering=0) as fa, open(lb, "rb", buffering=0) as fb:
+        while True:
+            na = _read_full(fa, ba)
+            nb = _read_full(fb, bb)
+            if na != nb:
+                return False, None
+            if na == chunk:
+                if ba != bb:
+                    return False, None
+                if h is not None:
+                    h.update(ba)
+                continue
+            if ba[:na] != bb[:nb]:
+                return False, None
+            if h is not None:
+                h.update(memoryview(ba)[:na])
+            break
+    if h is None:
+        return True, None
+    digest = h.hexdigest().lower()
+    HASH_CACHE.put(la, sa.st_size, int(sa.st_mtime_ns), algo, digest, inode_of(sa))
+    HASH_CACHE.put(lb, sb.st_size, int(sb.st_mtime_ns), algo, digest, inode_of(sb))
+    return True, digest
@@ -0,0 +1,58 @@
+import os
+import threading
+from array import array
+
+
+# ================== Path Table ==================
+class PathTable:
+    """
+    Prefix-compressed path storage: every directory string is kept once and a file path is an
+    int id referring to (directory id, basename). Memory grows with the number of directories
+    rather than total path characters.
+
+    Paths are not interned (that would cost a dict entry per file): add() returns a new id on
+    every call, so equal paths may have different ids; compare path() strings, not ids.
+    Adding is locked, since besides the Stage 1 scanner the Candidate a_paths/path_b setters
+    add paths from whichever thread assigns them; resolving ids needs no lock.
+    """
+    def __init__(self):
+        self.dirs: list[str] = []
+        self._dir_ids: dict[str, int] = {}
+        self._dir_of = array("I")
+        self._name_of: list[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._name_of)
+
+    def _dir_id(self, d: str) -> int:
+        i = self._dir_ids.get(d)
+        if i is None:
+            # append before publishing the id, so a reader that sees it can resolve it
+            self.dirs.append(d)
+            i = self._dir_ids[d] = len(self.dirs) - 1
+        return i
+
+    def dir_id(self, d: str) -> int:
+        with self._lock:
+            return self._dir_id(d)
+
+    def add(self, d: str, name: str) -> int:
+        """Return the id of the path d/name (a new id on every call)."""
+        with self._lock:
+            self._dir_of.append(self._dir_id(d))
+            self._name_of.append(name)
+            return len(self._name_of) - 1
+
+    def add_path(self, path: str) -> int:
+        d, name = os.path.split(path)
+        return self.add(d, name)
+
+    def path(self, pid: int) -> str:
+        return os.path.join(self.dirs[self._dir_of[pid]], self._name_of[pid])
+
+    def name(self, pid: int) -> str:
+        return self._name_of[pid]
+
+    def dir(self, pid: int) -> str:
+        return self.dirs[self._dir_of[pid]]
@@ -2,13 +2,27 @@ import os
 import time
 import threading
 
-from utils import iter_files, to_long_path
+from candidates import HARDLINK, Candidate, CandidateStore
+from folder_index import FolderIndex
+from paths import PathTable
+from walker import TreeWalker, WalkFilter
 
 # ================== Stage 1 Scanner ==================
 class Stage1Scanner:
     """
     Build an index of Folder A by (name_lower, size), then find candidate pairs in Folder B that share name+size.
     For each B candidate, store the list of possible A paths (all with the same name+size).
+    Both folders are listed at the same time by a TreeWalker with `workers` threads.
+    With `a_index`, Folder A is listed through a persistent FolderIndex, so unchanged
+    directories are loaded from disk instead of re-listed; it is saved once A is complete.
+    If a FolderWatcher keeps that index live, Folder A is not walked at all.
+    `filters` (include/exclude globs, size bounds, max depth, hidden) apply to both folders
+    and prune excluded subtrees before they are listed.
+    Paths are kept as ids into a per-run PathTable (each directory string stored once).
+    A paths that are hardlinks of one physical file under the same name are kept once, and
+    a B file that is a hardlink of its A candidate (same st_dev/st_ino) is a MATCH right
+    away. Device/inode come from the listing, so this needs a platform whose scandir
+    reports them (not Windows; there the Verifier checks with a stat instead of hashing).
     No hashing here.
     """
     def __init__(
@@ -20,9 +34,15 @@ class Stage1Scanner:
         ui_log=None,
         stop_event: threading.Event | None = None,
         pause_event: threading.Event | None = None,
+        workers: int = 1,
+        a_index: FolderIndex | None = None,
+        filters: WalkFilter | None = None,
     ):
         self.A = folder_a
         self.B = folder_b
+        self.workers = max(1, workers)
+        self.a_index = a_index
+        self.filters = filters if filters else None
         self.ui_progress = ui_progress or (lambda txt, pct: None)
         self.ui_stats = ui_stats or (lambda d: None)
         self.ui_log = ui_log or (lambda msg: None)
@@ -31,7 +51,11 @@ class Stage1Scanner:
         self.errors = []
         self.a_total = 0
         self.a_done = 0
+        self.b_done = 0
         self.candidates = 0
+        self.hardlinks = 0
+        self.a_collapsed = 0
+        self.paths = PathTable()
 
     def _prog(self, text: str, pct: float | None = None):
         self.ui_progress(text, pct)
@@ -39,73 +63,157 @@ class Stage1Scanner:
     def _stats(self):
         self.ui_stats({"a_done": self.a_done, "a_total": self.a_total, "candidates": self.candidates})
 
-    def run(self):
-        # Index A by name+size
-        a_map = {}  # normalized_name -> {size -> [path_a,...]}
-        files_a = list(iter_files(self.A))
-        self.a_total = len(files_a); self.a_done = 0
-        self._prog(f"Stage 1: indexing Folder A ({self.a_total} files)…", 0.0)
-        self._stats()
+    def _walk_error(self, path: str, e: Exception):
+        self.errors.append((path, str(e)))
+
+    def _save_index(self):
+        if self.a_index is not None and not self.a_index.live:
+            self._prog("Stage 1: saving Folder A index…", None)
+            self.a_index.save()
+
+    @staticmethod
+    def _freeze(a_map: dict):
+        """Turn the finished A path-id lists into tuples shared by every candidate row."""
+        for sizes in a_map.values():
+            for sz, paths in sizes.items():
+                sizes[sz] = tuple(paths)
+
+    def _add_a(self, a_map: dict, links: dict, e):
+        key = os.path.normcase(e.name)
+        if e.ino:
+            link = (e.dev, e.ino, key)
+            if link in links:
+                self.a_collapsed += 1  # another path to a physical file already indexed
+                return
+            pid = links[link] = self.paths.add(e.dir, e.name)
+        else:
+            pid = self.paths.add(e.dir, e.name)
+        a_map.setdefault(key, {}).setdefault(e.size, []).append(pid)
 
-        for p in files_a:
+    def _match_b(self, a_map: dict, links: dict, entries):
+        for e in entries:
             if self.stop_event.is_set():
-                self._prog("Stage 1: stopped.", None)
-                return []
+                return
             while self.pause_event.is_set():
                 time.sleep(0.1)
-            try:
-                sz = os.path.getsize(to_long_path(p))
-                nl = os.path.normcase(os.path.basename(p))
-                a_map.setdefault(nl, {}).setdefault(sz, []).append(p)
-                self.ui_log(f"Indexed A: {p}")
-            except Exception as e:
-                self.errors.append((p, str(e)))
-            finally:
-                self.a_done += 1
-                if self.a_done % 200 == 0 or self.a_done == self.a_total:
-                    self._prog(f"Stage 1: indexed {self.a_done}/{self.a_total}", self.a_done/max(1,self.a_total))
-                    self._stats()
+            self.b_done += 1
+            key = os.path.normcase(e.name)
+            sizes = a_map.get(key)
+            if not sizes:
+                continue
+            a_paths = sizes.get(e.size)
+            if not a_paths:
+                continue
+            # candidate found; the row shares a_map's tuple of possible A path ids
+            self.candidates += 1
+            self.ui_log(f"Scanned B: {e.path}")
+            row = Candidate(e.name, e.size, a_paths, self.paths.add(e.dir, e.name), self.paths)
+            pid = links.get((e.dev, e.ino, key)) if e.ino else None
+            if pid is not None and pid in a_paths and self.paths.path(pid) != e.path:
+                # B is a hardlink of an A file: identical by definition, no need to read either
+                row.promote_a(a_paths.index(pid))
+                row.status = "MATCH"
+                row.hash_algo = HARDLINK
+                self.hardlinks += 1
+                self.ui_log(f"Hardlink of Folder A file, matched without hashing: {e.path}")
+            yield row
 
-        # Scan B for name+size matches
-        results = []
-        files_b = list(iter_files(self.B))
-        total_b = len(files_b)
-        done_b = 0
-        self._prog(f"Stage 1: scanning Folder B for name+size matches ({total_b} files)…", 0.0)
+    def iter_candidates(self):
+        """
+        Yield candidate rows as soon as they are known.
+        A and B are listed concurrently; B files listed before the A index is complete are
+        held back (as lightweight entries) and matched the moment A's last directory is done,
+        after which B files are matched as they arrive. Progress is the fraction of
+        discovered directories already listed, so nothing has to be pre-counted.
+        """
+        a_map = {}  # normalized_name -> {size -> [path_id_a,...]}
+        links = {}  # (st_dev, st_ino, normalized_name) -> path_id_a
+        self.paths = PathTable()
+        held_b = []
+        a_complete = False
+        self.a_total = 0; self.a_done = 0; self.b_done = 0; self.candidates = 0
+        self.hardlinks = 0; self.a_collapsed = 0
+        live = self.a_index is not None and self.a_index.live
+        if live:
+            # A watcher keeps the index current: build a_map from memory and only walk B
+            entries = self.a_index.entries()
+            if self.filters is not None:
+                entries = self.filters.filter_entries(self.a_index.root, entries)
+            for e in entries:
+                self._add_a(a_map, links, e)
+                self.a_done += 1
+            self.a_total = self.a_done
+            a_complete = True
+            self._freeze(a_map)
+            self.ui_log(f"Folder A: {self.a_total} file(s) from the live index (not rescanned)")
+            self._prog(f"Stage 1: Folder A loaded from live index; listing Folder B ({self.workers} worker(s))…", 0.0)
+        else:
+            self._prog(f"Stage 1: listing Folder A and Folder B ({self.workers} worker(s))…", 0.0)
+        self._stats()
 
-        for p in files_b:
+        a_root = None if live else 0
+        walker = TreeWalker(
+            [self.B] if live else [self.A, self.B],
+            workers=self.workers,
+            on_error=self._walk_error,
+            stop_event=self.stop_event,
+            pause_event=self.pause_event,
+            indexes=None if live else [self.a_index, None],
+            filters=self.filters,
+        )
+        last = 0
+        for root, batch in walker.batches():
+            if root == a_root and batch is None:
+                a_complete = True
+                self.a_total = self.a_done
+                self._freeze(a_map)
+                if self.a_index is not None:
+                    self.ui_log(
+                        f"Folder A index: reused {self.a_index.reused} directories, "
+                        f"re-listed {self.a_index.listed}"
+                    )
+                self._prog(f"Stage 1: indexed {self.a_done}/{self.a_total}; matching Folder B…", walker.progress())
+                self._stats()
+                yield from self._match_b(a_map, links, held_b)
+                held_b = []
+            elif root == a_root:
+                for e in batch:
+                    if self.stop_event.is_set():
+                        break
+                    while self.pause_event.is_set():
+                        time.sleep(0.1)
+                    self._add_a(a_map, links, e)
+                    self.ui_log(f"Indexed A: {e.path}")
+                    self.a_done += 1
+                self.a_total = self.a_done
+            elif batch is not None:
+                if a_complete:
+                    yield from self._match_b(a_map, links, batch)
+                else:
+                    held_b.extend(batch)
             if self.stop_event.is_set():
+                if a_complete:
+                    self._save_index()
                 self._prog("Stage 1: stopped.", None)
-                return results
-            while self.pause_event.is_set():
-                time.sleep(0.1)
-            try:
-                nl = os.path.normcase(os.path.basename(p))
-                if nl not in a_map:
-                    continue
-                sz = os.path.getsize(to_long_path(p))
-                a_paths = a_map[nl].get(sz)
-                if not a_paths:
-                    continue
-                # candidate found; store all possible A paths for later hashing
-                results.append({
-                    "name": os.path.basename(p),
-                    "size": sz,
-                    "a_paths": list(a_paths),  # list of Folder-A paths with same name+size
-                    "path_b": p,
-                    "status": "PENDING",       # PENDING | MATCH | DIFF | ERROR | DELETED
-                    "hash_algo": None,         # filled after verify
-                    "hash_a": None,
-                    "hash_b": None
-                })
-                self.candidates += 1
+                return
+            seen = self.a_done + self.b_done
+            if seen - last >= 500:
+                last = seen
+                self._prog(
+                    f"Stage 1: indexed {self.a_done} A file(s), scanned {self.b_done} B file(s)…",
+                    walker.progress(),
+                )
                 self._stats()
-                self.ui_log(f"Scanned B: {p}")
-            except Exception as e:
-                self.errors.append((p, str(e)))
-            finally:
-                done_b += 1
-                if done_b % 500 == 0 or done_b == total_b:
-                    self._prog(f"Stage 1: scanned B {done_b}/{total_b}", done_b/max(1,total_b))
-        self._prog(f"Stage 1: done. Found {len(results)} candidate(s).", 1.0)
-        return results
+        self._stats()
+        if self.a_collapsed or self.hardlinks:
+            self.ui_log(
+                f"Hardlinks: {self.a_collapsed} duplicate Folder A path(s) collapsed, "
+                f"{self.hardlinks} B file(s) matched by inode"
+            )
+        if walker.dirs_pruned:
+            self.ui_log(f"Filters: skipped {walker.dirs_pruned} folder(s) without listing them")
+        self._save_index()
+        self._prog(f"Stage 1: done. Found {self.candidates} candidate(s).", 1.0)
+
+    def run(self) -> CandidateStore:
+        return CandidateStore(self.iter_candidates())
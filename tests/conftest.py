@@ -0,0 +1,18 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import hashing
+
+
+@pytest.fixture(autouse=True)
+def hash_cache(tmp_path):
+    """Point the global HASH_CACHE at a per-test database instead of the user's cache dir."""
+    cache = hashing.HASH_CACHE
+    cache.close()
+    cache.path = tmp_path / "hash_cache.sqlite3"
+    yield cache
+    cache.close()
@@ -0,0 +1,61 @@
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from candidates import MATCH, Candidate, CandidateStore
+from paths import PathTable
+from stage1 import Stage1Scanner
+
+
+def test_candidate_compact_fields_and_dict_interface():
+    c = Candidate("x.txt", 3, ("a1", "a2", "a3"), "b")
+    assert c["status"] == "PENDING" and c.get("hash_b") is None
+    c["status"] = "MATCH"
+    assert c.status_code == MATCH
+    c["hash_b"] = "ab" * 32
+    assert c._hash_b == bytes.fromhex("ab" * 32) and len(c._hash_b) == 32
+    assert c["hash_b"] == "ab" * 32
+
+    shared = c._a_paths
+    c["a_paths"] = ["a3", "a1", "a2"]
+    assert c["a_paths"] == ["a3", "a1", "a2"]
+    assert c._a_paths is shared  # reordering keeps the shared tuple
+
+
+def test_scanner_rows_share_a_path_tuples(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for d in ("d1", "d2"):
+        (a / d).mkdir(parents=True)
+        (a / d / "x.txt").write_text("same")
+        (b / d).mkdir(parents=True)
+        (b / d / "x.txt").write_text("same")
+
+    rows = Stage1Scanner(str(a), str(b)).run()
+    assert isinstance(rows, CandidateStore) and len(rows) == 2
+    assert rows[0]._a_paths is rows[1]._a_paths
+    assert rows.count_status("PENDING") == 2 and len(rows.pending()) == 2
+
+
+def test_path_table_ids_round_trip():
+    t = PathTable()
+    a = t.add("/data/photos", "x.jpg")
+    b = t.add_path("/data/photos/y.jpg")
+    assert (t.path(a), t.path(b)) == ("/data/photos/x.jpg", "/data/photos/y.jpg")
+    assert t.dirs == ["/data/photos"] and len(t) == 2  # directory stored once
+
+    c = Candidate("x.jpg", 1, (a, b), t.add("/in", "x.jpg"), t)
+    assert c["a_paths"] == ["/data/photos/x.jpg", "/data/photos/y.jpg"]
+    assert c["path_b"] == "/in/x.jpg"
+    c["a_paths"] = ["/data/photos/y.jpg", "/data/photos/x.jpg"]
+    assert c._a_paths == (a, b) and c.a_first == "/data/photos/y.jpg"
+
+
+def test_stage1_rerun_resets_candidate_count(tmp_path):
+    for side in ("A", "B"):
+        (tmp_path / side).mkdir()
+        (tmp_path / side / "x.txt").write_text("x")
+    scanner = Stage1Scanner(str(tmp_path / "A"), str(tmp_path / "B"))
+    assert len(list(scanner.iter_candidates())) == 1
+    assert len(list(scanner.iter_candidates())) == 1 and scanner.candidates == 1
@@ -1,9 +1,14 @@
 import os
 from pathlib import Path
 import sys
+import time
+
+import pytest
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+import verifier
+from candidates import Candidate
 from stage1 import Stage1Scanner
 from verifier import Verifier
 
@@ -266,3 +271,364 @@ def test_verifier_skips_missing_a_path(tmp_path):
     assert row["status"] == "MATCH"
     assert row["a_paths"][0] != removed
     assert os.path.exists(row["a_paths"][0])
+
+
+def test_stage1_parallel_walk_same_candidates(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for i in range(20):
+        write_file(a / f"d{i % 4}" / f"f{i}.txt", f"c{i}")
+        write_file(b / f"e{i % 3}" / f"f{i}.txt", f"c{i}")
+    write_file(b / "only_b.txt", "zzz")
+
+    serial = Stage1Scanner(str(a), str(b)).run()
+    parallel = Stage1Scanner(str(a), str(b), workers=8).run()
+    assert len(serial) == 20
+    key = lambda r: r["path_b"]
+    assert sorted(serial, key=key) == sorted(parallel, key=key)
+
+
+def test_stage1_iter_candidates_streams(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for i in range(5):
+        write_file(a / f"f{i}.txt", "x")
+        write_file(b / "sub" / f"f{i}.txt", "x")
+
+    progress = []
+    scanner = Stage1Scanner(str(a), str(b), ui_progress=lambda t, p: progress.append(p))
+    gen = scanner.iter_candidates()
+    first = next(gen)
+    assert first["status"] == "PENDING" and first["a_paths"]
+    rest = list(gen)
+    assert len(rest) == 4
+    assert scanner.candidates == 5 and scanner.a_total == 5 and scanner.b_done == 5
+    assert progress[-1] == 1.0
+
+
+def test_verify_stream_overlaps_with_producer(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for i in range(6):
+        write_file(a / f"f{i}.txt", f"c{i}")
+        write_file(b / f"f{i}.txt", f"c{i}" if i % 2 == 0 else f"x{i}")
+
+    rows = Stage1Scanner(str(a), str(b)).run()
+    assert len(rows) == 6
+    overlapped = []
+
+    def produce():
+        yield rows[0]
+        # The first row must be verified while the producer is still running
+        for _ in range(200):
+            if rows[0]["status"] != "PENDING":
+                break
+            time.sleep(0.01)
+        overlapped.append(rows[0]["status"] != "PENDING")
+        yield from rows[1:]
+
+    verifier = Verifier("sha256", workers=2, queue_size=1)
+    done, matches = verifier.verify_stream(produce())
+    assert overlapped == [True]
+    assert (done, matches) == (6, 3)
+
+
+def test_auto_verify_pipeline_from_scanner(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    write_file(a / "dup.txt", "same")
+    write_file(b / "dup.txt", "same")
+    write_file(a / "diff.txt", "abc")
+    write_file(b / "diff.txt", "xyz")
+
+    scanner = Stage1Scanner(str(a), str(b), workers=2)
+    rows = []
+
+    def collect():
+        for r in scanner.iter_candidates():
+            rows.append(r)
+            yield r
+
+    done, matches = Verifier("sha256", workers=2).verify_stream(collect())
+    assert (done, matches) == (2, 1)
+    assert {r["name"]: r["status"] for r in rows} == {"dup.txt": "MATCH", "diff.txt": "DIFF"}
+
+
+def test_hardlinks_match_without_hashing(tmp_path, monkeypatch):
+    a = tmp_path / 'A'
+    b = tmp_path / 'B'
+    write_file(a / 'x1' / 'photo.jpg', 'same')
+    write_file(a / 'other.jpg', 'other')
+    write_file(b / 'other.jpg', 'OTHER')
+    try:
+        os.makedirs(a / 'x2')
+        os.link(a / 'x1' / 'photo.jpg', a / 'x2' / 'photo.jpg')
+        os.link(a / 'x1' / 'photo.jpg', b / 'photo.jpg')
+        os.link(a / 'other.jpg', a / 'x1' / 'other.jpg')
+    except OSError:
+        pytest.skip('hardlinks not supported here')
+
+    hashed = []
+    orig = verifier.file_digest
+    monkeypatch.setattr(verifier, 'file_digest', lambda p, algo, *a: hashed.append(p) or orig(p, algo, *a))
+
+    rows = {r['name']: r for r in Stage1Scanner(str(a), str(b)).run()}
+    photo, other = rows['photo.jpg'], rows['other.jpg']
+    assert len(photo['a_paths']) == 1 and len(other['a_paths']) == 1  # links collapsed
+    if os.name != 'nt':  # scandir reports inodes; Windows leaves this to the Verifier
+        assert (photo['status'], photo['hash_algo']) == ('MATCH', 'hardlink')
+
+    done, matches = Verifier('sha256', workers=1).verify_rows(list(rows.values()))
+    assert photo['status'] == 'MATCH' and other['status'] == 'DIFF'
+    assert str(b / 'photo.jpg') not in hashed and str(a / 'x1' / 'photo.jpg') not in hashed
+    assert len(hashed) == 2  # B/other.jpg and one of its A links
+
+    # Rows the scanner could not classify (no inode in the listing) are caught by the Verifier's stat
+    row = Candidate('photo.jpg', 4, (str(a / 'x1' / 'photo.jpg'), str(a / 'x2' / 'photo.jpg')), str(b / 'photo.jpg'))
+    assert Verifier('sha256', workers=1).verify_rows([row]) == (1, 1)
+    assert (row['status'], row['hash_algo']) == ('MATCH', 'hardlink') and len(hashed) == 2
+
+
+def test_partial_fingerprint_rejects_before_full_hash(tmp_path, monkeypatch):
+    a = tmp_path / 'A'
+    b = tmp_path / 'B'
+    size = 4 * 1024 * 1024
+    make_large_file(a / 'video.mkv', size, b'\1')
+    make_large_file(b / 'video.mkv', size, b'\2')  # differs in the sampled head
+    make_large_file(a / 'same.mkv', size)
+    make_large_file(b / 'same.mkv', size)
+
+    full = []
+    orig = verifier.file_digest
+    monkeypatch.setattr(verifier, 'file_digest', lambda p, algo, *a: full.append(os.path.basename(p)) or orig(p, algo, *a))
+    rows = Stage1Scanner(str(a), str(b)).run()
+    assert Verifier('sha256', workers=2).verify_rows(rows) == (2, 1)
+    statuses = {r['name']: r['status'] for r in rows}
+    assert statuses == {'video.mkv': 'DIFF', 'same.mkv': 'MATCH'}
+    assert sorted(full) == ['same.mkv', 'same.mkv']  # the mismatch was never fully read
+
+
+def test_compare_strategy_reads_side_by_side(tmp_path, monkeypatch):
+    a = tmp_path / 'A'
+    b = tmp_path / 'B'
+    write_file(a / 'same.txt', 'identical' * 1000)
+    write_file(b / 'same.txt', 'identical' * 1000)
+    write_file(a / 'diff.txt', 'x' + 'y' * 5000)
+    write_file(b / 'diff.txt', 'z' + 'y' * 5000)
+
+    monkeypatch.setattr(verifier, 'file_digest', lambda p, algo, *a: pytest.fail('hashed instead of compared'))
+    rows = {r['name']: r for r in Stage1Scanner(str(a), str(b)).run()}
+    v = Verifier('sha256', workers=2, strategy='compare')
+    assert v.verify_rows(list(rows.values())) == (2, 1)
+
+    same, diff = rows['same.txt'], rows['diff.txt']
+    assert same['status'] == 'MATCH' and same['hash_a'] == same['hash_b']
+    # the digest computed while comparing was cached for both sides
+    assert verifier.cached_digest(str(b / 'same.txt'), 'sha256') == same['hash_b']
+    assert verifier.cached_digest(str(a / 'same.txt'), 'sha256') == same['hash_b']
+    assert (diff['status'], diff['hash_algo'], diff['hash_b']) == ('DIFF', 'compare', None)
+
+
+@pytest.mark.parametrize('algo', ['sha256', 'blake3'])
+def test_large_files_hash_via_mmap_within_thread_budget(tmp_path, monkeypatch, algo):
+    if algo == 'blake3':
+        pytest.importorskip('blake3')
+    import hashing
+    from utils import new_hasher
+
+    data = os.urandom(3 * 1024 * 1024 + 123)
+    p = tmp_path / 'big.bin'
+    p.write_bytes(data)
+    expected = new_hasher(algo)
+    expected.update(data)
+
+    borrowed = []
+    orig = hashing.new_hasher
+    monkeypatch.setattr(hashing, 'new_hasher', lambda a, threads=1: borrowed.append(threads) or orig(a, threads))
+    budget = hashing.ThreadBudget(3)
+    digest, size = hashing.file_digest(str(p), algo, budget, large_min=1024 * 1024)
+    assert (digest, size) == (expected.hexdigest(), len(data))
+    assert borrowed == [1 + min(3, (os.cpu_count() or 1) - 1)]
+    assert budget.spare == 3  # borrowed threads were returned
+
+
+def test_process_backend_hashes_in_children_and_caches_in_parent(tmp_path):
+    a = tmp_path / 'A'
+    b = tmp_path / 'B'
+    write_file(a / 'dup.txt', 'same')
+    write_file(b / 'dup.txt', 'same')
+    write_file(a / 'diff.txt', 'abc')
+    write_file(b / 'diff.txt', 'xyz')
+
+    rows = Stage1Scanner(str(a), str(b)).run()
+    assert Verifier('sha256', workers=2, backend='process').verify_rows(rows) == (2, 1)
+    statuses = {r['name']: r['status'] for r in rows}
+    assert statuses == {'dup.txt': 'MATCH', 'diff.txt': 'DIFF'}
+    dup = next(r for r in rows if r['name'] == 'dup.txt')
+    assert verifier.cached_digest(str(b / 'dup.txt'), 'sha256') == dup['hash_b']
+
+
+def test_sparse_files_hash_holes_without_reading(tmp_path):
+    import hashlib
+    import hashing
+
+    p = tmp_path / 'disk.img'
+    with open(p, 'wb') as f:
+        f.write(b'boot')
+        f.seek(40 * 1024 * 1024)
+        f.write(b'data' * 1024)
+        f.truncate(96 * 1024 * 1024)
+    if not hashing._is_sparse(os.stat(p)):
+        pytest.skip('filesystem stores no holes')
+
+    expected = hashlib.sha256(p.read_bytes()).hexdigest()
+    h = hashlib.sha256()
+    read = hashing.hash_stream(str(p), h)
+    assert h.hexdigest() == expected
+    assert read < 1024 * 1024  # only the data extents came off the disk
+
+
+@pytest.mark.parametrize('policy', ['off', 'sequential', 'bulk'])
+def test_fadvise_policy_hints(tmp_path, monkeypatch, policy):
+    import hashing
+
+    calls = []
+    for name, value in (('POSIX_FADV_SEQUENTIAL', 2), ('POSIX_FADV_WILLNEED', 3), ('POSIX_FADV_DONTNEED', 4)):
+        monkeypatch.setattr(os, name, value, raising=False)
+    names = {2: 'SEQUENTIAL', 3: 'WILLNEED', 4: 'DONTNEED'}
+    monkeypatch.setattr(os, 'posix_fadvise', lambda fd, off, n, adv: calls.append((names[adv], off, n)), raising=False)
+    p = tmp_path / 'f.bin'
+    p.write_bytes(b'x' * 2500)
+    hashing.hash_stream(str(p), hashing.new_hasher('sha256'), chunk=1000, fadvise=policy)
+
+    kinds = [c[0] for c in calls]
+    if policy == 'off':
+        assert calls == []
+    else:
+        assert kinds[0] == 'SEQUENTIAL' and ('WILLNEED', 1000, 1000) in calls
+    assert ('DONTNEED' in kinds) == (policy == 'bulk')
+    if policy == 'bulk':
+        assert calls[-1] == ('DONTNEED', 0, 0)
+
+
+def test_fast_prefilter_confirms_matches_cryptographically(tmp_path, monkeypatch):
+    a = tmp_path / 'A'
+    b = tmp_path / 'B'
+    write_file(a / 'dup.txt', 'same')
+    write_file(b / 'dup.txt', 'same')
+    write_file(a / 'diff.txt', 'abc')
+    write_file(b / 'diff.txt', 'xyz')
+
+    calls = []
+    orig = verifier.file_digest
+    monkeypatch.setattr(verifier, 'file_digest', lambda p, algo, *a: calls.append((os.path.basename(p), algo)) or orig(p, algo, *a))
+    v = Verifier('sha256', workers=1, prefilter=True)
+    rows = {r['name']: r for r in Stage1Scanner(str(a), str(b)).run()}
+    assert v.verify_rows(list(rows.values())) == (2, 1)
+
+    fast = v.fast_algo
+    assert (rows['diff.txt']['status'], rows['diff.txt']['hash_algo']) == ('DIFF', fast)
+    assert (rows['dup.txt']['status'], rows['dup.txt']['hash_algo']) == ('MATCH', 'sha256')
+    assert sorted(c for c in calls if c[0] == 'diff.txt') == [('diff.txt', fast)] * 2  # no sha256 read
+    assert sorted(c for c in calls if c[0] == 'dup.txt') == sorted([('dup.txt', fast)] * 2 + [('dup.txt', 'sha256')] * 2)
+
+
+def test_file_digest_stores_extra_digests_from_one_read(tmp_path, monkeypatch):
+    pytest.importorskip('blake3')
+    import hashlib
+    import hashing
+    from utils import new_hasher
+
+    p = tmp_path / 'f.bin'
+    p.write_bytes(os.urandom(100_000))
+    reads = []
+    orig = hashing.hash_stream
+    monkeypatch.setattr(hashing, 'hash_stream', lambda *a, **k: reads.append(a[0]) or orig(*a, **k))
+
+    sha, _ = hashing.file_digest(str(p), 'sha256', also=('blake3', 'sha256'))
+    b3, _ = hashing.file_digest(str(p), 'blake3')  # answered from the cache
+    expected = new_hasher('blake3')
+    expected.update(p.read_bytes())
+    assert sha == hashlib.sha256(p.read_bytes()).hexdigest() and b3 == expected.hexdigest()
+    assert len(reads) == 1
+
+
+def test_moved_file_hits_cache_by_inode(tmp_path, monkeypatch):
+    import hashing
+
+    src = tmp_path / 'A' / 'photo.jpg'
+    write_file(str(src), 'pixels' * 1000)
+    digest, _ = hashing.file_digest(str(src), 'sha256')
+    if hashing.inode_of(os.stat(src)) is None:
+        pytest.skip('no stable inode numbers here')
+    dst = tmp_path / 'sorted' / '2024' / 'renamed.jpg'
+    dst.parent.mkdir(parents=True)
+    os.rename(src, dst)
+    monkeypatch.setattr(hashing, '_hash_uncached', lambda *a: pytest.fail('moved file was re-hashed'))
+    assert hashing.file_digest(str(dst), 'sha256') == (digest, 6000)
+    assert hashing.cached_digest(str(dst), 'sha256') == digest
+
+
+def _verify_in_process(db, root):
+    import hashing
+
+    hashing.HASH_CACHE.path = Path(db)  # not opened yet in a fresh process
+    hashing.HASH_CACHE.FLUSH_EVERY = 4  # many small transactions, interleaved with the other processes
+    rows = Stage1Scanner(os.path.join(root, 'A'), os.path.join(root, 'B')).run()
+    done, matches = Verifier('sha256', 2, partial=False).verify_rows(rows)
+    assert done == matches == 25
+
+
+def test_parallel_processes_share_the_hash_cache(tmp_path):
+    import multiprocessing
+    import hashing
+
+    roots = []
+    for p in range(4):
+        root = tmp_path / f'share{p}'
+        for i in range(25):
+            for side in ('A', 'B'):
+                write_file(str(root / side / f'sub{i % 3}' / f'f{i}.txt'), f'{p}-{i}' * 50)
+        roots.append(str(root))
+    db = tmp_path / 'hash_cache.sqlite3'
+    ctx = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=_verify_in_process, args=(str(db), r)) for r in roots]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(60)
+    assert [proc.exitcode for proc in procs] == [0] * 4
+
+    cache = hashing.HashCache(db)
+    assert len(cache) == 4 * 25 * 2  # every A and B file of every process
+    f = os.path.join(roots[3], 'B', 'sub1', 'f7.txt')
+    st = os.stat(f)
+    assert cache.get(hashing.to_long_path(f), st.st_size, st.st_mtime_ns, 'sha256') == hashing.file_digest(f, 'sha256')[0]
+    cache.close()
+
+
+def test_verifier_threads_release_their_cache_connections(tmp_path, hash_cache):
+    write_file(tmp_path / 'A' / 'x.txt', 'same')
+    write_file(tmp_path / 'B' / 'x.txt', 'same')
+    for _ in range(5):
+        hash_cache.clear()
+        rows = Stage1Scanner(str(tmp_path / 'A'), str(tmp_path / 'B')).run()
+        assert Verifier('sha256', workers=4).verify_rows(rows) == (1, 1)
+    assert len(hash_cache._connections) <= 2  # this thread's, and the checkpointer's while it runs
+
+
+def test_verifier_survives_a_row_that_raises(tmp_path, monkeypatch):
+    for i in range(20):
+        write_file(tmp_path / 'A' / f'{i}.txt', str(i))
+        write_file(tmp_path / 'B' / f'{i}.txt', str(i))
+    orig = Verifier._verify_row
+
+    def verify_row(self, row):
+        if row['name'] in ('3.txt', '7.txt'):
+            raise RuntimeError("boom")
+        return orig(self, row)
+
+    monkeypatch.setattr(Verifier, '_verify_row', verify_row)
+    rows = Stage1Scanner(str(tmp_path / 'A'), str(tmp_path / 'B')).run()
+    assert Verifier('sha256', workers=2, queue_size=1).verify_rows(rows) == (20, 18)
+    assert sorted(r['name'] for r in rows if r['status'] == 'ERROR') == ['3.txt', '7.txt']
@@ -0,0 +1,78 @@
+import os
+import shutil
+import time
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from folder_index import FolderIndex
+from stage1 import Stage1Scanner
+
+
+def age_dirs(root, seconds=3600):
+    """Push directory mtimes into the past so they are outside the racy window."""
+    past = time.time() - seconds
+    for d, _, _ in os.walk(root):
+        os.utime(d, (past, past))
+
+
+def build(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for i in range(4):
+        (a / f"d{i}").mkdir(parents=True)
+        (a / f"d{i}" / f"f{i}.txt").write_text("x" * i)
+    b.mkdir()
+    for i in range(5):
+        (b / f"f{i}.txt").write_text("x" * i)
+    age_dirs(a)
+    return a, b
+
+
+def scan(a, b, index_file):
+    index = FolderIndex(str(a), index_file)
+    index.load()
+    rows = Stage1Scanner(str(a), str(b), workers=2, a_index=index).run()
+    return index, sorted(r["path_b"] for r in rows)
+
+
+def test_rescan_reuses_unchanged_directories(tmp_path):
+    a, b = build(tmp_path)
+    index_file = tmp_path / "index.pickle"
+
+    first, rows1 = scan(a, b, index_file)
+    assert (first.reused, first.listed) == (0, 5)
+    assert len(rows1) == 4
+    assert index_file.exists()
+
+    second, rows2 = scan(a, b, index_file)
+    assert (second.reused, second.listed) == (5, 0)
+    assert rows2 == rows1
+
+
+def test_changed_directory_is_relisted_and_removed_one_pruned(tmp_path):
+    a, b = build(tmp_path)
+    index_file = tmp_path / "index.pickle"
+    scan(a, b, index_file)
+
+    (a / "d1" / "f4.txt").write_text("x" * 4)
+    shutil.rmtree(a / "d3")
+    age_dirs(a, seconds=60)  # new, but still old enough to be trusted
+    index, rows = scan(a, b, index_file)
+    assert index.listed == 4  # d3 is gone; every remaining mtime changed
+    assert str(b / "f4.txt") in rows and str(b / "f3.txt") not in rows
+
+    os.utime(a / "d1", (time.time() - 30, time.time() - 30))
+    index, _ = scan(a, b, index_file)
+    assert (index.reused, index.listed) == (3, 1)
+    assert str(a / "d3") not in index.dirs
+
+
+def test_recently_modified_directory_not_trusted(tmp_path):
+    a, b = build(tmp_path)
+    index_file = tmp_path / "index.pickle"
+    os.utime(a / "d0")  # mtime == now: inside the racy window
+    scan(a, b, index_file)
+    index, _ = scan(a, b, index_file)
+    assert index.listed == 1 and index.reused == 4
@@ -142,15 +142,20 @@ def test_drag_and_drop_folder_selection(tmp_path):
 
 def test_pause_and_log_panel(tmp_path, monkeypatch):
     import stage1
-    orig_iter = stage1.iter_files
+    orig_walker = stage1.TreeWalker
 
-    def slow_iter(path):
-        for p in orig_iter(path):
+    class SlowWalker(orig_walker):
+        def batches(self):
             import time
-            time.sleep(0.01)
-            yield p
+            for root, batch in super().batches():
+                if batch is None:
+                    yield root, None
+                    continue
+                for e in batch:
+                    time.sleep(0.01)
+                    yield root, [e]
 
-    monkeypatch.setattr(stage1, "iter_files", slow_iter)
+    monkeypatch.setattr(stage1, "TreeWalker", SlowWalker)
 
     win = App()
     a = tmp_path / "A"
@@ -179,3 +184,89 @@ def test_pause_and_log_panel(tmp_path, monkeypatch):
     win.stage1_thread.wait()
     win.log_box.setChecked(False)
     assert not win.log_view.isVisible()
+
+
+def test_stage1_rows_stream_into_table(tmp_path, monkeypatch):
+    from gui import Stage1Worker
+
+    monkeypatch.setattr(Stage1Worker, "BATCH_ROWS", 3)
+    win = App()
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    a.mkdir()
+    b.mkdir()
+    for i in range(10):
+        (a / f"f{i}.txt").write_text("x")
+        (b / f"f{i}.txt").write_text("x")
+    (b / "only_b.txt").write_text("x")
+
+    batches = []
+    orig_batch = win._stage1_batch
+    monkeypatch.setattr(win, "_stage1_batch", lambda rows: (batches.append(len(rows)), orig_batch(rows)))
+    win.entry_a.setText(str(a))
+    win.entry_b.setText(str(b))
+    win.start_stage1()
+    for _ in range(100):
+        if win.current_worker is None:
+            break
+        QTest.qWait(50)
+    assert win.current_worker is None
+    assert len(batches) >= 4 and max(batches) <= 3
+    assert win.table.rowCount() == 10
+    assert win.label_candidates.text() == "10"
+    assert win.btn_verify_all.isEnabled()
+    assert "Stage 1 complete: 10" in win.status_label.text()
+
+
+def test_stage1_auto_verify(tmp_path):
+    win = App()
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    a.mkdir()
+    b.mkdir()
+    (a / "dup.txt").write_text("same")
+    (b / "dup.txt").write_text("same")
+    (a / "diff.txt").write_text("abc")
+    (b / "diff.txt").write_text("xyz")
+
+    win.entry_a.setText(str(a))
+    win.entry_b.setText(str(b))
+    win.algo_combo.setCurrentText("sha256")
+    win.chk_auto_verify.setChecked(True)
+    win.start_stage1()
+    for _ in range(100):
+        if win.current_worker is None:
+            break
+        QTest.qWait(50)
+    statuses = {r["name"]: r["status"] for r in win.candidates}
+    assert statuses == {"dup.txt": "MATCH", "diff.txt": "DIFF"}
+    assert win.label_v_matches.text() == "1"
+    assert "auto-verify complete" in win.status_label.text()
+
+
+def test_stage1_exclude_filter(tmp_path, monkeypatch):
+    win = App()
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    for root in (a, b):
+        (root / "node_modules").mkdir(parents=True)
+        (root / "keep.txt").write_text("same")
+        (root / "node_modules" / "dep.js").write_text("same")
+
+    win.entry_a.setText(str(a))
+    win.entry_b.setText(str(b))
+    errors = []
+    monkeypatch.setattr(QMessageBox, "critical", lambda *args: errors.append(args[1]))
+    for bad in ("lots", "inf", "1e400"):
+        win.entry_min_size.setText(bad)
+        win.start_stage1()
+    assert errors == ["Invalid size"] * 3 and win.current_worker is None
+
+    win.entry_min_size.setText("1")
+    win.entry_exclude.setText("node_modules; *.tmp")
+    win.start_stage1()
+    for _ in range(100):
+        if win.current_worker is None:
+            break
+        QTest.qWait(50)
+    assert [r["name"] for r in win.candidates] == ["keep.txt"]
@@ -0,0 +1,106 @@
+from pathlib import Path
+import json
+import sys
+import time
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import hashing
+from hashing import HashCache
+
+
+def test_hash_cache_sqlite_batches_and_migrates_json(tmp_path, monkeypatch):
+    db = tmp_path / "hash_cache.sqlite3"
+    legacy = tmp_path / "hash_cache.json"
+    legacy.write_text(json.dumps({"/d/a|1|2|sha256|v1": "aa", "/d/b|3|4|sha256|v1": "bb"}))
+    monkeypatch.setattr(hashing, "_cache_path", lambda: db)
+    c = HashCache()
+    assert legacy.exists() and not db.exists()  # opened lazily by the first lookup
+    assert c.get("/d/a", 1, 2, "sha256") == "aa" and len(c) == 2
+    assert not legacy.exists() and (tmp_path / "hash_cache.json.migrated").exists()
+    assert c.get("/d/a", 1, 3, "sha256") is None  # mtime changed
+    c.put("/d/a", 1, 5, "sha256", "cc")  # supersedes the entry for the old mtime
+    assert c.get("/d/a", 1, 5, "sha256") == "cc" and c._pending
+    assert c.drop_paths(["/d/b"]) == 1 and c.get("/d/b", 3, 4, "sha256") is None
+    c.close()
+    c = HashCache()
+    assert c.get("/d/a", 1, 5, "sha256") == "cc" and len(c) == 1
+    c.close()
+
+
+def test_hash_cache_evicts_least_recently_used_and_compacts(tmp_path):
+    c = HashCache(tmp_path / "hash_cache.sqlite3", max_entries=4)
+    c.FLUSH_EVERY = 1
+    for i in range(4):
+        c.put(f"/gone/f{i}", 1, 1, "sha256", "aa")
+    assert c.get("/gone/f0", 1, 1, "sha256") == "aa"  # f0 is now the most recently used
+    c.save()
+    c.put("/gone/f4", 1, 1, "sha256", "aa")  # over budget: evict down to 90% of 4
+    assert len(c) == 3 and c.get("/gone/f0", 1, 1, "sha256") == "aa"
+    c.put("/gone/f0", 2, 2, "blake3", "bb")  # the file changed: its sha256 digest is superseded
+    assert c.get("/gone/f0", 1, 1, "sha256") is None
+
+    real = tmp_path / "real.txt"
+    real.write_text("x")
+    st = real.stat()
+    c.put(str(real), st.st_size, st.st_mtime_ns, "sha256", "cc")
+    assert c.compact(workers=2, batch=2) == 3
+    assert len(c) == 1 and c.get(str(real), st.st_size, st.st_mtime_ns, "sha256") == "cc"
+    c.close()
+
+
+def test_hash_cache_checkpoints_unsaved_puts(tmp_path):
+    db = tmp_path / "hash_cache.sqlite3"
+    c = HashCache(db, checkpoint_seconds=0.05)
+    c.put("/d/big.iso", 1, 2, "sha256", "aa")  # far below FLUSH_EVERY
+    other = HashCache(db)  # e.g. the next start after a crash
+    deadline = time.monotonic() + 5
+    while other.get("/d/big.iso", 1, 2, "sha256") is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert other.get("/d/big.iso", 1, 2, "sha256") == "aa"
+    c.close()
+    assert c._checkpointer is None
+    other.close()
+
+
+def test_hash_cache_import_skips_malformed_json_rows(tmp_path):
+    legacy = tmp_path / "hash_cache.json"
+    legacy.write_text(json.dumps({
+        "/d/a|1|2|sha256|v1": "aa",
+        "/d/b|3|4|sha256|v1": "not hex",
+        "/d/c|x|4|sha256|v1": "cc",
+        "/d/e|5|6|sha256|v1": None,
+        "/d/f|7|8|sha256|v1": "ff",
+    }))
+    c = HashCache(tmp_path / "hash_cache.sqlite3")
+    assert c.get("/d/a", 1, 2, "sha256") == "aa" and c.get("/d/f", 7, 8, "sha256") == "ff"
+    assert len(c) == 2 and not c._pending
+    assert not legacy.exists() and (tmp_path / "hash_cache.json.migrated").exists()
+    c.close()
+
+
+def test_hash_cache_inode_lookup_uses_partial_index(tmp_path):
+    c = HashCache(tmp_path / "hash_cache.sqlite3")
+    plan = c._con().execute(f"EXPLAIN QUERY PLAN {HashCache._INODE_LOOKUP}", (1, 1, 1, 1, "sha256")).fetchall()
+    assert any("USING INDEX digests_inode" in row[-1] for row in plan), plan
+    c.close()
+
+
+def test_hash_cache_recovers_from_corrupt_or_unopenable_database(tmp_path):
+    db = tmp_path / "hash_cache.sqlite3"
+    db.write_bytes(b"not a database" * 100)
+    c = HashCache(db)
+    assert c.get("/d/a", 1, 2, "sha256") is None
+    c.put("/d/a", 1, 2, "sha256", "aa")
+    c.save()
+    assert (tmp_path / "hash_cache.sqlite3.corrupt").exists() and len(c) == 1
+    c.close()
+
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("x")
+    c = HashCache(blocker / "hash_cache.sqlite3")  # the cache directory can't be created
+    assert c.get("/d/a", 1, 2, "sha256") is None
+    c.put("/d/a", 1, 2, "sha256", "aa")
+    c.save()
+    assert c.get("/d/a", 1, 2, "sha256") is None and len(c) == 0 and c.compact() == 0
+    c.close()
@@ -0,0 +1,124 @@
+import os
+import threading
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import walker
+from walker import TreeWalker, WalkFilter, iter_entries
+
+
+def test_iter_entries_single_stat_fields(tmp_path):
+    (tmp_path / "sub" / "deep").mkdir(parents=True)
+    (tmp_path / "top.txt").write_text("abc")
+    (tmp_path / "sub" / "deep" / "leaf.bin").write_bytes(b"x" * 10)
+
+    entries = {e.name: e for e in iter_entries(tmp_path)}
+    assert set(entries) == {"top.txt", "leaf.bin"}
+
+    leaf = entries["leaf.bin"]
+    assert leaf.path == str(tmp_path / "sub" / "deep" / "leaf.bin")
+    st = os.stat(leaf.path)
+    assert leaf.size == 10
+    assert leaf.mtime_ns == st.st_mtime_ns
+    if os.name != "nt":
+        assert (leaf.dev, leaf.ino) == (st.st_dev, st.st_ino)
+
+
+def test_iter_entries_reports_errors(tmp_path):
+    errors = []
+    missing = tmp_path / "missing"
+    assert list(iter_entries(missing, on_error=lambda p, e: errors.append(p))) == []
+    assert errors == [str(missing)]
+
+
+def make_tree(root, dirs=30, files=5):
+    for d in range(dirs):
+        sub = root / f"d{d % 3}" / f"s{d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for f in range(files):
+            (sub / f"f{f}.txt").write_text("x" * f)
+
+
+def test_tree_walker_matches_sequential_walk(tmp_path):
+    make_tree(tmp_path)
+    expected = sorted(e.path for e in iter_entries(tmp_path))
+    for workers in (1, 4):
+        walker = TreeWalker([tmp_path], workers=workers)
+        assert sorted(e.path for e in walker) == expected
+        assert walker.dirs_done == walker.dirs_found
+        assert walker.progress() == 1.0
+
+
+def test_tree_walker_tags_roots_and_signals_completion(tmp_path):
+    a = tmp_path / "A"
+    b = tmp_path / "B"
+    make_tree(a, dirs=10)
+    make_tree(b, dirs=4)
+    counts = {0: 0, 1: 0}
+    done = []
+    for root, batch in TreeWalker([a, b], workers=3).batches():
+        if batch is None:
+            done.append(root)
+        else:
+            assert root not in done
+            counts[root] += len(batch)
+    assert sorted(done) == [0, 1]
+    assert counts == {0: 50, 1: 20}
+
+
+def test_tree_walker_stop_event(tmp_path):
+    make_tree(tmp_path)
+    stop = threading.Event()
+    stop.set()
+    assert list(TreeWalker([tmp_path], workers=4, stop_event=stop)) == []
+
+
+def test_tree_walker_raises_lister_errors_instead_of_hanging(tmp_path):
+    for i in range(4):
+        (tmp_path / f"d{i}").mkdir()
+
+    class BrokenIndex:
+        def list_dir(self, d, on_error=None):
+            if d != str(tmp_path):
+                raise RuntimeError("corrupt index")
+            return walker.list_dir(d, on_error)
+
+    w = TreeWalker([tmp_path], workers=2, indexes=[BrokenIndex()])
+    result = []
+    t = threading.Thread(target=lambda: result.append(pytest.raises(RuntimeError, list, w)))
+    t.start()
+    t.join(10)
+    assert not t.is_alive() and result
+
+
+def test_walk_filter_prunes_subtrees_before_listing(tmp_path, monkeypatch):
+    for d in (".git/objects", "node_modules/pkg", "src/deep/deeper", "src/cache"):
+        (tmp_path / d).mkdir(parents=True)
+    (tmp_path / ".git" / "objects" / "blob").write_text("x")
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("x")
+    (tmp_path / "src" / "a.py").write_text("x" * 10)
+    (tmp_path / "src" / "small.py").write_text("x")
+    (tmp_path / "src" / "notes.txt").write_text("x" * 10)
+    (tmp_path / "src" / "cache" / "b.py").write_text("x" * 10)
+    (tmp_path / "src" / "deep" / "c.py").write_text("x" * 10)
+    (tmp_path / "src" / "deep" / "deeper" / "d.py").write_text("x" * 10)
+
+    listed = []
+    orig = walker.list_dir
+    monkeypatch.setattr(walker, "list_dir", lambda d, on_error=None: listed.append(d) or orig(d, on_error))
+    flt = WalkFilter(
+        include=["*.py"], exclude=["node_modules", "src/cache"], min_size=2, max_depth=2, skip_hidden=True
+    )
+    tw = TreeWalker([str(tmp_path)], workers=2, filters=flt)
+    names = sorted(e.name for e in tw)
+    assert names == ["a.py", "c.py"]
+    assert sorted(os.path.relpath(d, tmp_path) for d in listed) == [".", "src", os.path.join("src", "deep")]
+    assert tw.dirs_pruned == 4  # .git, node_modules, src/cache, src/deep/deeper
+
+    # The same rules applied to a ready-made listing (live index) give the same files
+    full = list(iter_entries(tmp_path))
+    assert sorted(e.name for e in flt.filter_entries(str(tmp_path), full)) == names
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import stage1
+from folder_index import FolderIndex
+from hashing import HashCache
+from stage1 import Stage1Scanner
+from utils import to_long_path
+from watcher import FolderWatcher
+
+
+def wait_for(cond, timeout=5.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def indexed_names(index):
+    return {e.name for e in index.entries()}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = HashCache(tmp_path / "hash_cache.sqlite3")
+    yield c
+    c.close()
+
+
+def start(tmp_path, cache, **kw):
+    a = tmp_path / "A"
+    (a / "sub").mkdir(parents=True)
+    (a / "keep.txt").write_text("keep")
+    (a / "sub" / "edit.txt").write_text("old")
+    w = FolderWatcher(FolderIndex(str(a), tmp_path / "index.pickle"), hash_cache=cache, **kw)
+    w.start()
+    assert w.ready.wait(5) and w.index.live
+    return a, w
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_watcher_applies_changes_and_invalidates_cache(tmp_path, cache, use_inotify):
+    if use_inotify and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+    a, w = start(tmp_path, cache, use_inotify=use_inotify, poll_interval=0.05)
+    try:
+        assert w.mode == ("inotify" if use_inotify else "polling")
+        assert indexed_names(w.index) == {"keep.txt", "edit.txt"}
+        edit = a / "sub" / "edit.txt"
+        st = os.stat(edit)
+        cache.put(to_long_path(str(edit)), st.st_size, st.st_mtime_ns, "sha256", "aa")
+        cache.put(to_long_path(str(a / "keep.txt")), 4, 1, "sha256", "bb")
+
+        (a / "new").mkdir()
+        (a / "new" / "added.txt").write_text("new")
+        # An in-place edit does not change the directory mtime; push it so polling sees it too
+        edit.write_text("changed!")
+        os.utime(a / "sub", ns=(st.st_mtime_ns + 10**9, st.st_mtime_ns + 10**9))
+        assert wait_for(lambda: "added.txt" in indexed_names(w.index))
+        assert wait_for(lambda: len(cache) == 1)
+        assert cache.get(to_long_path(str(a / "keep.txt")), 4, 1, "sha256") == "bb"
+
+        (a / "keep.txt").unlink()
+        assert wait_for(lambda: "keep.txt" not in indexed_names(w.index))
+        assert wait_for(lambda: len(cache) == 0)
+    finally:
+        w.stop()
+    assert not w.index.live
+
+
+def test_stage1_uses_live_index_without_walking_a(tmp_path, cache, monkeypatch):
+    a, w = start(tmp_path, cache, use_inotify=False, poll_interval=60)
+    b = tmp_path / "B"
+    b.mkdir()
+    (b / "keep.txt").write_text("keep")
+    roots = []
+    orig = stage1.TreeWalker
+
+    class SpyWalker(orig):
+        def __init__(self, r, **kw):
+            roots.append([str(x) for x in r])
+            super().__init__(r, **kw)
+
+    monkeypatch.setattr(stage1, "TreeWalker", SpyWalker)
+    try:
+        rows = Stage1Scanner(str(a), str(b), a_index=w.index).run()
+    finally:
+        w.stop()
+    assert roots == [[str(b)]]
+    assert [r["a_paths"] for r in rows] == [[str(a / "keep.txt")]]
@@ -1,24 +1,49 @@
 import os
 import hashlib
 import importlib.util
+import math
 from pathlib import Path
 
+from platformdirs import user_cache_dir
+
 # ================== Config ==================
 READ_CHUNK = 8 * 1024 * 1024  # 8MB
 DEFAULT_WORKERS = min(16, max(4, (os.cpu_count() or 4) * 2))
 
+def cache_dir() -> Path:
+    """Per-user cache directory shared by the hash cache and folder indexes."""
+    d = Path(user_cache_dir("DedupeUI"))
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
 def has_blake3() -> bool:
     try:
         return importlib.util.find_spec("blake3") is not None
     except Exception:
         return False
 
-def new_hasher(algo: str):
-    """Lazy hasher factory (imports blake3 only if selected and available)."""
+def has_xxhash() -> bool:
+    try:
+        return importlib.util.find_spec("xxhash") is not None
+    except Exception:
+        return False
+
+def fast_algo() -> str:
+    """Best available non-cryptographic 128-bit hash: xxh3_128, else stdlib blake2b-128."""
+    return "xxh3_128" if has_xxhash() else "blake2b128"
+
+def new_hasher(algo: str, threads: int = 1):
+    """Lazy hasher factory (imports blake3/xxhash only if selected and available).
+    `threads` > 1 lets blake3 hash one input on several threads; other algos ignore it."""
     a = algo.lower()
     if a == "blake3":
         import blake3  # type: ignore
-        return blake3.blake3()
+        return blake3.blake3(max_threads=threads) if threads > 1 else blake3.blake3()
+    if a == "xxh3_128":
+        import xxhash  # type: ignore
+        return xxhash.xxh3_128()
+    if a == "blake2b128":
+        return hashlib.blake2b(digest_size=16)
     return hashlib.new("sha256")
 
 def to_long_path(p: str | Path) -> str:
@@ -40,7 +65,19 @@ def human_size(n: int) -> str:
             return f"{x:.1f} {u}" if u != "B" else f"{int(x)} {u}"
         x /= 1024.0
 
-def iter_files(folder: str | Path):
-    for path in Path(folder).rglob("*"):
-        if path.is_file():
-            yield str(path)
+def parse_size(text: str) -> int | None:
+    """Parse '500', '10K', '1.5 MB', '2G' (binary units) into bytes; '' gives None."""
+    t = text.strip().upper().replace(" ", "").removesuffix("B")
+    if not t:
+        return None
+    mult = 1
+    for i, u in enumerate("KMGT", 1):
+        if t.endswith(u):
+            t, mult = t[:-1], 1024 ** i
+            break
+    value = float(t) * mult  # ValueError for anything else
+    if not math.isfinite(value):
+        raise ValueError(f"size out of range: {text!r}")  # 'inf', 'nan', '1e400'
+    if value < 0:
+        raise ValueError(f"negative size: {text!r}")
+    return int(value)
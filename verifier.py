@@ -1,8 +1,20 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import os
+import queue
 import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
 
-from hashing import file_digest
+from candidates import COMPARED, HARDLINK
+from hashing import (
+    FADVISE_DEFAULT, FADVISE_POLICIES, HASH_CACHE, LARGE_FILE_MIN, PARTIAL_MIN_SIZE, ThreadBudget, cached_digest, compare_files, file_digest, partial_digest,
+)
+from utils import fast_algo, to_long_path
+
+_STOP = object()
+STRATEGIES = ("hash", "compare")
+BACKENDS = ("thread", "process")
 
 # ================== Stage 2 Verifier (hash on demand) ==================
 class Verifier:
@@ -19,107 +31,332 @@ class Verifier:
         ui_log=None,
         stop_event: threading.Event | None = None,
         pause_event: threading.Event | None = None,
+        queue_size: int | None = None,
+        partial: bool = True,  # rule out A paths by a head/middle/tail fingerprint first, see _partial_filter
+        strategy: str = "hash",  # "compare": read B and a lone A path side by side, see _should_compare
+        compare_hash: bool = True,  # with "compare", hash the bytes of a match so the HashCache is filled
+        large_file_min: int = LARGE_FILE_MIN,  # files this big are hashed from a memory map
+        backend: str = "thread",  # "process": full hashes run in a pool of `workers` processes
+        fadvise: str = FADVISE_DEFAULT,  # page-cache policy for full hashes (hashing.FADVISE_POLICIES)
+        prefilter: bool = False,  # rule out A paths by a fast non-cryptographic hash first, see _fast_filter
+        also=(),  # more algos computed in the same read pass as a full hash, and cached
     ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend!r}; expected one of {BACKENDS}")
+        if fadvise not in FADVISE_POLICIES:
+            raise ValueError(f"unknown fadvise policy {fadvise!r}; expected one of {FADVISE_POLICIES}")
         self.algo = algo
+        self.partial = partial
+        self.strategy = strategy
+        self.compare_hash = compare_hash
+        self.large_file_min = large_file_min
+        self.backend = backend
+        self.fadvise = fadvise
+        self.also = tuple(a for a in also if a != algo)
+        self.fast_algo = fast_algo()
+        # blake2b is no faster than blake3, so without xxhash the prefilter only pays off for sha256
+        self.prefilter = prefilter and not (self.fast_algo == "blake2b128" and algo == "blake3")
+        self.budget = ThreadBudget(0)
+        self._pool = None
 
         self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 4
         self.ui_progress = ui_progress or (lambda txt, pct: None)
         self.ui_counter = ui_counter or (lambda done, total, matches: None)
         self.ui_log = ui_log or (lambda msg: None)
         self.stop_event = stop_event or threading.Event()
         self.pause_event = pause_event or threading.Event()
 
-    def verify_rows(self, rows: list[dict]):
-        pending = [r for r in rows if r.get("status") == "PENDING"]
-        total = len(pending)
-        if total == 0:
-            self.ui_progress("Stage 2: nothing to verify (all selected rows already checked).", None)
-            return 0, 0
-        self.ui_progress(f"Stage 2: hashing {total} selected item(s) with {self.algo}…", 0.0)
-        done = 0
-        matches = 0
+    def _wait_if_paused(self):
+        while self.pause_event.is_set() and not self.stop_event.is_set():
+            time.sleep(0.1)
 
-        # Hash helper using cache
-        def _digest(path):
-            d, _ = file_digest(path, self.algo)
-            return d
+    def _digest(self, path: str, algo: str | None = None) -> str:
+        """Digest with `algo` (a prefilter pass) or, by default, the full hash plus `also`."""
+        also = () if algo else self.also
+        d, _ = file_digest(path, algo or self.algo, self.budget, self.large_file_min, self._pool, self.fadvise, also)
+        return d
 
-        # Hash all B first (parallel)
-        def _hash_b(row):
+    @staticmethod
+    def _scan_links(row: dict) -> tuple[str | None, list[str]]:
+        """
+        Stat (not read) B and the A paths. Returns the A path hardlinked to B, if any (a MATCH
+        with no hashing), and the A paths worth hashing: one per physical file, in the row's order.
+        """
+        a_paths = row["a_paths"]
+        try:
+            sb = os.stat(to_long_path(row["path_b"]))
+        except OSError:
+            return None, a_paths
+        b_norm = os.path.normcase(os.path.abspath(row["path_b"]))
+        unique = []
+        seen = set()
+        for ap in a_paths:
             try:
-                hb = _digest(row["path_b"])
-                return (row, hb, None)
-            except Exception as e:
-                return (row, None, f"hash_B: {e}")
-
-        with ThreadPoolExecutor(max_workers=self.workers) as ex:
-            futures = [ex.submit(_hash_b, r) for r in pending]
-            for fut in as_completed(futures):
-                if self.stop_event.is_set():
-                    break
-                while self.pause_event.is_set():
-                    time.sleep(0.1)
-                row, hb, err = fut.result()
-                if err:
-                    row["status"] = "ERROR"
-                    row["hash_b"] = None
-                    row["hash_algo"] = self.algo
-                else:
-                    row["hash_b"] = hb
-                    row["hash_algo"] = self.algo
-                self.ui_log(f"Hashed B: {row['path_b']}")
-
-        # For each row, compute A hashes lazily until we find a match
-        for row in pending:
+                sa = os.stat(to_long_path(ap))
+            except OSError:
+                unique.append(ap)  # let hashing report it
+                continue
+            if not sa.st_ino:
+                unique.append(ap)  # inode unknown on this filesystem
+                continue
+            key = (sa.st_dev, sa.st_ino)
+            if key == (sb.st_dev, sb.st_ino) and os.path.normcase(os.path.abspath(ap)) != b_norm:
+                return ap, a_paths
+            if key not in seen:
+                seen.add(key)
+                unique.append(ap)
+        return None, unique
+
+    def _partial_filter(self, row: dict, a_paths: list[str]) -> list[str]:
+        """
+        A paths whose head/middle/tail fingerprint (hashing.partial_digest) equals B's, all of
+        them if B cannot be sampled. A row with none left is DIFF without a full read.
+        """
+        try:
+            if cached_digest(row["path_b"], self.algo):
+                return a_paths  # B's full digest is known; sampling would not save its read
+            fb, _ = partial_digest(row["path_b"], self.algo)
+        except Exception:
+            return a_paths  # the full hash reports the error
+        survivors = []
+        for ap in a_paths:
             if self.stop_event.is_set():
                 break
-            while self.pause_event.is_set():
-                time.sleep(0.1)
+            try:
+                fa, _ = partial_digest(ap, self.algo)
+            except Exception:
+                survivors.append(ap)
+                continue
+            if fa == fb:
+                survivors.append(ap)
+        return survivors
 
-            if row["status"] == "ERROR":
-                done += 1
-                self.ui_progress(f"Stage 2: verified {done}/{total}", done/max(1,total))
-                self.ui_counter(done, total, matches)
+    def _fast_filter(self, row: dict, a_paths: list[str]) -> tuple[str | None, list[str]]:
+        """
+        B's fast digest (utils.fast_algo: xxh3_128, or blake2b-128 without xxhash) and the A paths
+        whose fast digest equals it, all of them on error. Survivors are confirmed with `algo`.
+        """
+        try:
+            if cached_digest(row["path_b"], self.algo):
+                return None, a_paths  # B's full digest is known; the fast pass would not save its read
+            fb = self._digest(row["path_b"], self.fast_algo)
+        except Exception:
+            return None, a_paths  # the full hash reports the error
+        survivors = []
+        for ap in a_paths:
+            if self.stop_event.is_set():
+                break
+            self._wait_if_paused()
+            try:
+                fa = self._digest(ap, self.fast_algo)
+            except Exception:
+                survivors.append(ap)
                 continue
+            if fa == fb:
+                survivors.append(ap)
+        return fb, survivors
+
+    def _should_compare(self, path_b: str, to_hash: list[str]) -> bool:
+        """Read side by side (hashing.compare_files) when one A path is left and nothing is cached."""
+        if self.strategy != "compare" or len(to_hash) != 1:
+            return False
+        try:
+            return not cached_digest(path_b, self.algo) and not cached_digest(to_hash[0], self.algo)
+        except OSError:
+            return False  # the hashing path reports the error
+
+    def _compare_row(self, row: dict, ap: str) -> bool:
+        try:
+            equal, digest = compare_files(ap, row["path_b"], self.algo if self.compare_hash else None)
+        except Exception as e:
+            row["status"] = "ERROR"
+            self.ui_log(f"Error comparing {row['path_b']} with {ap}: {e}")
+            return False
+        row["hash_algo"] = self.algo if digest else COMPARED
+        row["hash_a"] = row["hash_b"] = digest
+        if not equal:
+            row["status"] = "DIFF"
+            self.ui_log(f"Compared, differs: {row['path_b']}")
+            return False
+        row["status"] = "MATCH"
+        a_paths = row["a_paths"]
+        if a_paths[0] != ap:
+            row["a_paths"] = [ap] + [p for p in a_paths if p != ap]
+        self.ui_log(f"Compared, identical to {ap}: {row['path_b']}")
+        return True
 
-            matched = False
-            hashed_any = False
-            for ap in row["a_paths"]:
+    def _verify_row(self, row: dict) -> bool:
+        """Hash B, then A paths lazily until one matches. Returns True on MATCH."""
+        a_paths = row["a_paths"]
+        linked, to_hash = self._scan_links(row)
+        if linked is not None:
+            row["hash_algo"] = HARDLINK
+            row["status"] = "MATCH"
+            if a_paths[0] != linked:
+                row["a_paths"] = [linked] + [p for p in a_paths if p != linked]
+            self.ui_log(f"Hardlink of {linked}, matched without hashing: {row['path_b']}")
+            return True
+
+        row["hash_algo"] = self.algo
+        if self.partial and row["size"] >= PARTIAL_MIN_SIZE:
+            to_hash = self._partial_filter(row, to_hash)
+            if not to_hash:
                 if self.stop_event.is_set():
-                    break
-                while self.pause_event.is_set():
-                    time.sleep(0.1)
+                    return False
+                row["status"] = "DIFF"
+                self.ui_log(f"Partial hash differs from every A path: {row['path_b']}")
+                return False
+        if self._should_compare(row["path_b"], to_hash):
+            return self._compare_row(row, to_hash[0])
+        if self.prefilter:
+            fast_b, to_hash = self._fast_filter(row, to_hash)
+            if not to_hash:
+                if self.stop_event.is_set():
+                    return False
+                row["hash_algo"] = self.fast_algo
+                row["hash_b"] = fast_b
+                row["status"] = "DIFF"
+                self.ui_log(f"Fast hash differs from every A path: {row['path_b']}")
+                return False
+        try:
+            row["hash_b"] = self._digest(row["path_b"])
+        except Exception as e:
+            row["status"] = "ERROR"
+            row["hash_b"] = None
+            self.ui_log(f"Error hashing B {row['path_b']}: {e}")
+            return False
+        self.ui_log(f"Hashed B: {row['path_b']}")
+
+        hashed_any = False
+        for ap in to_hash:
+            if self.stop_event.is_set():
+                return False
+            self._wait_if_paused()
+            try:
+                ha = self._digest(ap)
+                hashed_any = True
+                self.ui_log(f"Hashed A: {ap}")
+            except Exception:
+                continue
+
+            row["hash_a"] = ha
+            if ha == row["hash_b"]:
+                row["status"] = "MATCH"
+                # put this A path first (for display); candidate rows only store its index
+                if a_paths[0] != ap:
+                    row["a_paths"] = [ap] + [p for p in a_paths if p != ap]
+                return True
+
+        row["status"] = "DIFF" if hashed_any else "ERROR"
+        return False
+
+    def _run(self, rows: Iterable[dict], total: int | None) -> tuple[int, int]:
+        """
+        Feed rows through a bounded queue to the worker pool, so they can come from a generator
+        that is still producing them; total=None means streaming.
+        """
+        q = queue.Queue(maxsize=self.queue_size)
+        lock = threading.Lock()
+        counts = {"done": 0, "matches": 0, "queued": 0}
+        # spare cores for blake3 on large files; grows as workers run out of rows
+        self.budget = ThreadBudget((os.cpu_count() or 1) - self.workers)
+
+        def work():
+            try:
+                while True:
+                    row = q.get()
+                    if row is _STOP:
+                        self.budget.give(1)  # an idle worker's core can speed up someone's large file
+                        return
+                    if self.stop_event.is_set():
+                        continue
+                    self._wait_if_paused()
+                    try:
+                        matched = self._verify_row(row)
+                    except Exception as e:  # a bug or a broken cache must not kill the worker
+                        row["status"] = "ERROR"
+                        matched = False
+                        self.ui_log(f"Error verifying {row['path_b']}: {e}")
+                    with lock:
+                        counts["done"] += 1
+                        counts["matches"] += matched
+                        done, matches = counts["done"], counts["matches"]
+                        n = total if total is not None else counts["queued"]
+                    if total is not None:
+                        self.ui_progress(f"Stage 2: verified {done}/{total}", done/max(1,total))
+                    self.ui_counter(done, n, matches)
+            finally:
+                HASH_CACHE.release_thread()
+
+        if self.backend == "process":
+            # spawn, not fork: the parent has Qt and walker threads running. The program must
+            # call multiprocessing.freeze_support() first under `if __name__ == "__main__":`
+            # (a PyInstaller build re-runs the executable in each child). The HashCache stays here.
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        threads = [threading.Thread(target=work, name=f"verifier-{i}", daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+
+        def put(item) -> bool:
+            """Queue item; False if every worker has died and nobody would take it."""
+            while any(t.is_alive() for t in threads):
                 try:
-                    ha = _digest(ap)
-                    hashed_any = True
-                    self.ui_log(f"Hashed A: {ap}")
-                except Exception:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
                     continue
+            return False
 
-                row["hash_a"] = ha
-                if ha == row["hash_b"]:
-                    matched = True
-                    row["status"] = "MATCH"
-                    matches += 1
-                    # put this A path first (for display)
-                    if row["a_paths"][0] != ap:
-                        row["a_paths"].remove(ap)
-                        row["a_paths"].insert(0, ap)
+        try:
+            for row in rows:
+                if self.stop_event.is_set():
+                    break
+                if row.get("status") != "PENDING":
+                    continue
+                with lock:
+                    counts["queued"] += 1
+                if not put(row):
                     break
+        finally:
+            for _ in threads:
+                if not put(_STOP):
+                    break
+            for t in threads:
+                t.join()
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            HASH_CACHE.save()  # completed, stopped or failed: keep every digest computed
+            HASH_CACHE.release_thread()
+        return counts["done"], counts["matches"]
 
-            if matched:
-                pass
-            elif hashed_any:
-                row["status"] = "DIFF"
-            else:
-                row["status"] = "ERROR"
+    def verify_rows(self, rows: list[dict]):
+        pending = [r for r in rows if r.get("status") == "PENDING"]
+        total = len(pending)
+        if total == 0:
+            self.ui_progress("Stage 2: nothing to verify (all selected rows already checked).", None)
+            return 0, 0
+        self.ui_progress(f"Stage 2: hashing {total} selected item(s) with {self.algo}…", 0.0)
 
-            done += 1
-            self.ui_progress(f"Stage 2: verified {done}/{total}", done/max(1,total))
-            self.ui_counter(done, total, matches)
+        done, matches = self._run(pending, total)
 
         if self.stop_event.is_set():
             self.ui_progress("Stage 2: stopped.", None)
         else:
             self.ui_progress(f"Stage 2: done. Verified {done} item(s), {matches} match(es).", 1.0)
         return done, matches
+
+    def verify_stream(self, rows: Iterable[dict]):
+        """
+        Verify rows while they are still being produced (auto-verify).
+        The bounded queue applies back-pressure to the producer, so disk reads for hashing
+        overlap with directory traversal without buffering the whole candidate list.
+        Progress text is left to the producer; counters report done/queued so far.
+        """
+        done, matches = self._run(rows, None)
+        if self.stop_event.is_set():
+            self.ui_progress("Stage 2: stopped.", None)
+        return done, matches
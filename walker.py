@@ -0,0 +1,333 @@
+import os
+import queue
+import re
+import stat
+import threading
+import time
+from collections import deque
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple, Sequence
+
+from utils import to_long_path
+
+
+# ================== Directory Walker ==================
+class FileEntry(NamedTuple):
+    """One regular file found by the walker, filled from a single stat."""
+    dir: str
+    name: str
+    size: int
+    mtime_ns: int
+    ino: int  # 0 when the platform does not report it (e.g. DirEntry on Windows)
+    dev: int
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.dir, self.name)
+
+
+def list_dir(d: str, on_error=None) -> tuple[list[FileEntry], list[str]]:
+    """List one directory: (file entries, subdirectory paths)."""
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(to_long_path(d)) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.join(d, e.name))
+                    elif e.is_file():
+                        st = e.stat()
+                        files.append(FileEntry(d, e.name, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev))
+                except OSError as ex:
+                    if on_error:
+                        on_error(os.path.join(d, e.name), ex)
+    except OSError as ex:
+        if on_error:
+            on_error(d, ex)
+    return files, subdirs
+
+
+def iter_entries(
+    folder: str | Path,
+    on_error: Callable[[str, Exception], None] | None = None,
+) -> Iterator[FileEntry]:
+    """Yield a FileEntry for every regular file below folder.
+
+    Uses os.scandir so each file costs one DirEntry.stat() (free on Windows,
+    where it comes from the directory listing) and no Path allocation. Like
+    Path.rglob, symlinked directories are not descended into while symlinked
+    files are reported with the stat of their target.
+    """
+    stack = [str(folder)]
+    while stack:
+        files, subdirs = list_dir(stack.pop(), on_error)
+        yield from files
+        stack.extend(subdirs)
+
+
+_HIDDEN_ATTRS = getattr(stat, "FILE_ATTRIBUTE_HIDDEN", 0x2) | getattr(stat, "FILE_ATTRIBUTE_SYSTEM", 0x4)
+
+
+class WalkFilter:
+    """
+    Pruning rules evaluated while walking, so excluded subtrees are never listed.
+
+    - exclude: glob patterns matched against folder and file names (or, when a pattern contains
+      "/", against the path relative to the root, e.g. "photos/cache"); a matching folder is
+      skipped together with everything below it.
+    - include: when given, only files matching one of these patterns are kept (folders are
+      still descended into).
+    - min_size / max_size: inclusive byte bounds for files (None = unbounded).
+    - max_depth: levels of subfolders below the root to descend into (0 = root only, None = all).
+    - skip_hidden: skip dot-files and dot-folders, and on Windows anything with the hidden or
+      system attribute.
+    """
+    def __init__(
+        self,
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        min_size: int | None = None,
+        max_size: int | None = None,
+        max_depth: int | None = None,
+        skip_hidden: bool = False,
+    ):
+        self.include = list(include)
+        self.exclude = list(exclude)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+
+    @staticmethod
+    def parse_globs(text: str) -> list[str]:
+        """Split a user-entered pattern list ("a; b, c") into patterns."""
+        return [p.strip() for p in re.split(r"[;,\n]", text or "") if p.strip()]
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.include or self.exclude or self.skip_hidden
+            or self.min_size is not None or self.max_size is not None or self.max_depth is not None
+        )
+
+    @staticmethod
+    def _rel(root: str, path: str) -> str:
+        return path[len(root):].lstrip("\\/").replace(os.sep, "/")
+
+    @staticmethod
+    def _match(patterns: list[str], rel: str, name: str) -> bool:
+        return any(fnmatch(rel if "/" in p else name, p) for p in patterns)
+
+    @staticmethod
+    def _hidden(path: str, name: str) -> bool:
+        if name.startswith("."):
+            return True
+        if os.name == "nt":
+            try:
+                return bool(os.lstat(to_long_path(path)).st_file_attributes & _HIDDEN_ATTRS)
+            except OSError:
+                return False
+        return False
+
+    def keep_dir(self, root: str, path: str, depth: int) -> bool:
+        """Whether to list `path`, a folder `depth` levels below `root`."""
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        name = os.path.basename(path)
+        if self.skip_hidden and self._hidden(path, name):
+            return False
+        return not (self.exclude and self._match(self.exclude, self._rel(root, path), name))
+
+    def keep_file(self, root: str, e: FileEntry) -> bool:
+        if self.min_size is not None and e.size < self.min_size:
+            return False
+        if self.max_size is not None and e.size > self.max_size:
+            return False
+        if not (self.skip_hidden or self.exclude or self.include):
+            return True
+        path = e.path
+        if self.skip_hidden and self._hidden(path, e.name):
+            return False
+        rel = self._rel(root, path)
+        if self.exclude and self._match(self.exclude, rel, e.name):
+            return False
+        return not self.include or self._match(self.include, rel, e.name)
+
+    def filter_entries(self, root: str, entries) -> list[FileEntry]:
+        """Apply the rules to an already-built listing (e.g. a live FolderIndex)."""
+        verdict = {}
+
+        def dir_ok(d: str) -> bool:
+            ok = verdict.get(d)
+            if ok is None:
+                if len(d) <= len(root):
+                    ok = True
+                else:
+                    depth = self._rel(root, d).count("/") + 1
+                    ok = dir_ok(os.path.dirname(d)) and self.keep_dir(root, d, depth)
+                verdict[d] = ok
+            return ok
+
+        return [e for e in entries if dir_ok(e.dir) and self.keep_file(root, e)]
+
+
+_DONE = object()
+
+
+class TreeWalker:
+    """
+    Multi-threaded scandir walker over one or more roots.
+
+    Every worker owns a deque of directories: it pops from its own tail (depth first)
+    and, when that runs dry, steals from the head of another worker's deque, where the
+    shallowest and therefore largest subtrees sit. Listing latency on network shares is
+    overlapped across workers while a single consumer receives the files in batches
+    through a bounded queue, so the index can be built without locking.
+    `indexes` optionally gives, per root, an object whose list_dir() replaces the plain
+    listing (see folder_index.FolderIndex). `filters` prunes folders before they are
+    queued and drops files before they are batched (see WalkFilter).
+    """
+    def __init__(
+        self,
+        roots: Sequence[str | Path],
+        workers: int = 1,
+        on_error: Callable[[str, Exception], None] | None = None,
+        stop_event: threading.Event | None = None,
+        pause_event: threading.Event | None = None,
+        batch_size: int = 512,
+        indexes: Sequence | None = None,
+        filters: WalkFilter | None = None,
+    ):
+        self.roots = [str(r) for r in roots]
+        self.indexes = list(indexes) if indexes else [None] * len(self.roots)
+        self.workers = max(1, workers)
+        self.on_error = on_error
+        self.stop_event = stop_event or threading.Event()
+        self.pause_event = pause_event or threading.Event()
+        self.batch_size = batch_size
+        self.filters = filters if filters else None
+        self.dirs_pruned = 0
+        self.dirs_found = len(self.roots)
+        self.dirs_done = 0
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._pending = [1] * len(self.roots)  # directories queued or being listed, per root
+        self._deques = [deque() for _ in range(self.workers)]
+        for i, r in enumerate(self.roots):
+            self._deques[i % self.workers].append((i, r, 0))
+        self._out = queue.Queue(maxsize=max(16, self.workers * 4))
+        self._halt = threading.Event()
+        self._failed: BaseException | None = None  # first unexpected error in a worker
+
+    def _put(self, item) -> None:
+        while not self._halt.is_set():
+            try:
+                self._out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _steal(self, idx: int):
+        n = self.workers
+        for k in range(1, n):
+            try:
+                return self._deques[(idx + k) % n].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def _run(self, idx: int) -> None:
+        own = self._deques[idx]
+        try:
+            while not self._halt.is_set() and not self.stop_event.is_set() and self._failed is None:
+                while self.pause_event.is_set() and not self._halt.is_set():
+                    time.sleep(0.1)
+                try:
+                    root, d, depth = own.pop()
+                except IndexError:
+                    item = self._steal(idx)
+                    if item is None:
+                        with self._work:
+                            if not any(self._pending):
+                                self._work.notify_all()
+                                return
+                            self._work.wait(0.05)
+                        continue
+                    root, d, depth = item
+
+                index = self.indexes[root]
+                lister = index.list_dir if index is not None else list_dir
+                try:
+                    files, subdirs = lister(d, self.on_error)
+                except Exception as ex:
+                    # Not an OSError (those go to on_error): the walk cannot be trusted, so end
+                    # every worker and let batches() re-raise instead of waiting on this directory
+                    with self._work:
+                        if self._failed is None:
+                            self._failed = ex
+                        self._work.notify_all()
+                    return
+                flt = self.filters
+                if flt is not None:
+                    top = self.roots[root]
+                    kept = [s for s in subdirs if flt.keep_dir(top, s, depth + 1)]
+                    if len(kept) != len(subdirs):
+                        with self._lock:
+                            self.dirs_pruned += len(subdirs) - len(kept)
+                    subdirs = kept
+                    files = [e for e in files if flt.keep_file(top, e)]
+                if subdirs:
+                    own.extend((root, s, depth + 1) for s in subdirs)
+                    with self._work:
+                        self._pending[root] += len(subdirs)
+                        self.dirs_found += len(subdirs)
+                        self._work.notify_all()
+                for i in range(0, len(files), self.batch_size):
+                    self._put((root, files[i:i + self.batch_size]))
+                # Only count the directory as done once its files are queued, so the
+                # per-root completion marker is always the last item for that root
+                with self._work:
+                    self._pending[root] -= 1
+                    self.dirs_done += 1
+                    root_done = self._pending[root] == 0
+                if root_done:
+                    self._put((root, None))
+        finally:
+            self._put(_DONE)
+
+    def batches(self) -> Iterator[tuple[int, list[FileEntry] | None]]:
+        """
+        Yield (root_index, entries) as directories are listed; entries is None exactly once
+        per root, after every directory below it has been listed. An unexpected exception
+        raised while listing (e.g. by an index's list_dir) is re-raised here.
+        """
+        threads = [
+            threading.Thread(target=self._run, args=(i,), name=f"walker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in threads:
+            t.start()
+        try:
+            finished = 0
+            while finished < len(threads):
+                item = self._out.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                yield item
+        finally:
+            self._halt.set()
+            for t in threads:
+                t.join()
+        if self._failed is not None:
+            raise self._failed
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        for _, batch in self.batches():
+            if batch:
+                yield from batch
+
+    def progress(self) -> float:
+        """Fraction of discovered directories already listed (grows as the tree is found)."""
+        return self.dirs_done / max(1, self.dirs_found)
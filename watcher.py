@@ -0,0 +1,220 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+
+from folder_index import FolderIndex
+from hashing import HASH_CACHE, HashCache
+
+# inotify(7) event bits
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = (
+    IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify (no third-party dependency)."""
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+        self.wd_to_dir: dict[int, str] = {}
+
+    def add(self, d: str) -> bool:
+        """Watch d; False if it vanished, OSError if the kernel refuses (e.g. watch limit)."""
+        wd = self._add_watch(self.fd, os.fsencode(d), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            raise OSError(err, os.strerror(err), d)
+        self.wd_to_dir[wd] = d  # re-adding a moved directory returns its old wd
+        return True
+
+    def read(self, timeout: float) -> list[tuple[str | None, int]]:
+        """Return (watched_dir, mask) for events available within timeout."""
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return []
+        try:
+            buf = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        off = 0
+        while off < len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, off)
+            off += _EVENT.size + length
+            if mask & IN_IGNORED:
+                self.wd_to_dir.pop(wd, None)
+                continue
+            events.append((self.wd_to_dir.get(wd), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+# ================== Folder Watcher ==================
+class FolderWatcher:
+    """
+    Keep a FolderIndex live in a background thread so Stage 1 never has to walk Folder A again.
+
+    On Linux every indexed directory gets an inotify watch; an event re-lists just that directory
+    (new subdirectories are indexed and watched, removed ones forgotten). Elsewhere, or when
+    inotify is unavailable or out of watches, the index is refreshed every `poll_interval`
+    seconds, which re-lists only directories whose mtime changed. Either way, files that
+    disappeared or changed are dropped from the hash cache.
+    """
+    def __init__(
+        self,
+        index: FolderIndex,
+        hash_cache: HashCache = HASH_CACHE,
+        ui_log=None,
+        poll_interval: float = 5.0,
+        use_inotify: bool | None = None,
+        workers: int = 1,
+    ):
+        self.index = index
+        self.hash_cache = hash_cache
+        self.ui_log = ui_log or (lambda msg: None)
+        self.poll_interval = poll_interval
+        self.use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self.workers = max(1, workers)
+        self.mode = None  # "inotify" | "polling" once ready
+        self.updates = 0  # number of change batches applied
+        self.ready = threading.Event()
+        self.stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, save: bool = True):
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if save and self.mode:
+            self.index.save()
+
+    def _log_error(self, path: str, e: Exception):
+        self.ui_log(f"Watcher error: {path}: {e}")
+
+    def _invalidate(self):
+        stale = self.index.take_stale()
+        if stale:
+            dropped = self.hash_cache.drop_paths(stale)
+            self.ui_log(f"Watcher: {len(stale)} file(s) changed in Folder A, {dropped} cached digest(s) dropped")
+        self.updates += 1
+
+    def _watch(self, ino: _Inotify, dirs) -> None:
+        watched = set(ino.wd_to_dir.values())
+        for d in dirs:
+            if d not in watched:
+                ino.add(d)
+
+    def _run(self):
+        ino = None
+        try:
+            if not self.index.dirs:
+                self.index.load()
+            if self.use_inotify:
+                try:
+                    ino = _Inotify()
+                    # Watch what the stored index already knows before syncing, so nothing is missed
+                    self._watch(ino, list(self.index.dirs))
+                except (OSError, AttributeError) as e:
+                    self.ui_log(f"Watcher: inotify unavailable ({e}); polling every {self.poll_interval:g}s")
+                    if ino is not None:
+                        ino.close()
+                    ino = None
+            if not self.index.refresh(self.workers, self._log_error, self.stop_event):
+                return
+            if ino is not None:
+                try:
+                    self._watch(ino, list(self.index.dirs))
+                except OSError as e:
+                    self.ui_log(f"Watcher: cannot watch every folder ({e}); polling every {self.poll_interval:g}s")
+                    ino.close()
+                    ino = None
+                # Catch anything that changed while the new watches were being added
+                self.index.refresh(self.workers, self._log_error, self.stop_event)
+            self._invalidate()
+            self.index.save()
+            self.mode = "inotify" if ino is not None else "polling"
+            self.index.live = True
+            self.ready.set()
+            self.ui_log(f"Watcher: Folder A index is live ({self.mode})")
+
+            if ino is not None and not self._inotify_loop(ino):
+                ino.close()
+                ino = None
+                self.mode = "polling"
+            if ino is None:
+                self._poll_loop()
+        finally:
+            self.index.live = False
+            self.ready.set()  # never leave waiters hanging, even on failure
+            if ino is not None:
+                ino.close()
+            self.hash_cache.release_thread()
+
+    def _inotify_loop(self, ino: _Inotify) -> bool:
+        """Apply events until stopped; False means fall back to polling."""
+        while not self.stop_event.is_set():
+            events = ino.read(0.5)
+            if not events:
+                continue
+            dirty = set()
+            overflow = False
+            for d, mask in events:
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif d is not None:
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and d != self.index.root:
+                        dirty.add(os.path.dirname(d))
+                    else:
+                        dirty.add(d)
+            try:
+                if overflow:
+                    self.ui_log("Watcher: event queue overflowed; refreshing Folder A index")
+                    self.index.refresh(self.workers, self._log_error, self.stop_event)
+                    self._watch(ino, list(self.index.dirs))
+                else:
+                    for d in dirty:
+                        self._watch(ino, self.index.relist(d, self._log_error))
+            except OSError as e:
+                self.ui_log(f"Watcher: cannot watch new folders ({e}); switching to polling")
+                self._invalidate()
+                return False
+            self._invalidate()
+        return True
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            if self.index.refresh(self.workers, self._log_error, self.stop_event):
+                self._invalidate()